@@ -0,0 +1,35 @@
+"""Create sync state table
+
+Revision ID: 5b1e0c7d9a24
+Revises: 032390abe0c6
+Create Date: 2026-10-18 18:02:41.512093
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b1e0c7d9a24"
+down_revision = "032390abe0c6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "syncstate",
+        sa.Column("id", sa.String(length=50), nullable=False),
+        sa.Column("value", sa.String(length=255), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.func.now(),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade():
+    op.drop_table("syncstate")
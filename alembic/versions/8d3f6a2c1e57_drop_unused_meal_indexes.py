@@ -0,0 +1,36 @@
+"""Drop unused meal indexes
+
+Revision ID: 8d3f6a2c1e57
+Revises: 5b1e0c7d9a24
+Create Date: 2026-10-18 19:12:05.218374
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8d3f6a2c1e57"
+down_revision = "5b1e0c7d9a24"
+branch_labels = None
+depends_on = None
+
+# Every query uses the primary key. The index on id duplicates it, and the
+# dishes and frozen flags are never filtered by the database.
+INDEXES = {
+    "ix_meal_id": "id",
+    "ix_meal_L1": "L1",
+    "ix_meal_L1.frozen": "L1.frozen",
+    "ix_meal_L2": "L2",
+    "ix_meal_L2.frozen": "L2.frozen",
+    "ix_meal_D": "D",
+    "ix_meal_D.frozen": "D.frozen",
+}
+
+
+def upgrade():
+    for name in INDEXES:
+        op.drop_index(name, table_name="meal")
+
+
+def downgrade():
+    for name, column in INDEXES.items():
+        op.create_index(name, "meal", [column], unique=False)
@@ -0,0 +1,74 @@
+"""Analytics related API endpoints."""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .. import crud
+from ..core.analytics import DishOrder, MealSlot, dish_analytics
+from ..deps.conditional import view_conditional_get
+from ..deps.database import get_db
+from ..deps.security import token_middleware
+from ..schemas.analytics import DishStats, RebuildResult
+from ..utils.metrics import InstrumentedRoute
+from ..utils.responses import gen_responses
+
+router = APIRouter(
+    route_class=InstrumentedRoute,
+    tags=["Analytics"],
+    dependencies=[Depends(token_middleware)],
+    **gen_responses({401: "Missing Token", 403: "Invalid token"}),
+)
+
+
+@router.get(
+    "/dishes",
+    dependencies=[Depends(view_conditional_get(dish_analytics))],
+    response_model=List[DishStats],
+    summary="Get dish statistics",
+)
+def get_dishes_stats(
+    *,
+    slot: Optional[MealSlot] = Query(None, description="Slot (any if missing)"),
+    order: DishOrder = Query(DishOrder.FREQUENCY),
+    limit: Optional[int] = Query(None, ge=1, description="Max dishes to return"),
+):
+    """Returns how many days each dish was eaten, when it was eaten first and
+    last, and the average days between its repeats.
+
+    Placeholders (N/A, Variable) are ignored and dishes are grouped ignoring
+    case. `stale` orders the dishes not eaten for the longest time first.
+    Statistics are served from an in-memory aggregate.
+    """
+    return dish_analytics.get_stats(slot=slot, order=order)[:limit]
+
+
+@router.get(
+    "/dishes/{dish}",
+    dependencies=[Depends(view_conditional_get(dish_analytics))],
+    response_model=DishStats,
+    summary="Get statistics of a dish",
+    **gen_responses({404: "Not Found"}),
+)
+def get_dish_stats(
+    *,
+    dish: str,
+    slot: Optional[MealSlot] = Query(None, description="Slot (any if missing)"),
+):
+    """Returns the statistics of a dish, ignoring case."""
+    stats = dish_analytics.get_dish(dish, slot=slot)
+    if stats is None:
+        raise HTTPException(404, "Dish not found")
+    return stats
+
+
+@router.post(
+    "/rebuild",
+    response_model=RebuildResult,
+    summary="Rebuild in-memory views",
+)
+def rebuild_views(*, db=Depends(get_db)):
+    """Rebuilds the in-memory views of the meals (dish statistics and search)
+    from the database, to repair any drift."""
+    crud.meal.rebuild_listeners(db)
+    return RebuildResult(meals=len(dish_analytics))
@@ -1,12 +1,18 @@
 """Cron related API endpoints."""
 
-from fastapi import APIRouter, BackgroundTasks, Depends
+from typing import List
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
 
 from ..core.cron import CRON_MAP, ValidCron
+from ..cron.history import run_history
 from ..deps.security import token_middleware
+from ..schemas.cron import CronRun
+from ..utils.metrics import InstrumentedRoute
 from ..utils.responses import gen_responses
 
 router = APIRouter(
+    route_class=InstrumentedRoute,
     tags=["Cron"],
     dependencies=[Depends(token_middleware)],
     **gen_responses({401: "Missing Token", 403: "Invalid token"}),
@@ -22,5 +28,19 @@ router = APIRouter(
 )
 def get_meals(cron: ValidCron, background_tasks: BackgroundTasks):
     """Launches a cronjob in the background."""
-    background_tasks.add_task(CRON_MAP[cron])
+    background_tasks.add_task(run_history.run_job, cron.value, CRON_MAP[cron])
     return cron
+
+
+@router.get(
+    "/{cron}/runs",
+    response_model=List[CronRun],
+    summary="Get Cron Runs",
+)
+def get_cron_runs(
+    cron: ValidCron,
+    limit: int = Query(20, ge=1, description="Max runs to return"),
+):
+    """Returns the last runs of a cronjob (scheduled or launched from the API),
+    newest first. Only the runs of this server since it started are kept."""
+    return run_history.get_runs(cron.value, limit)
@@ -1,20 +1,44 @@
 """Meal related API endpoints."""
 
 import datetime
-from typing import List, Union
+from typing import Iterator, List, Optional, Sequence, Union
 
-from fastapi import APIRouter, BackgroundTasks, Depends
-from starlette.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.responses import Response, StreamingResponse
 
 from .. import crud
-from ..core.meals import SwapMode, paginate, simplify, simplify_asked
-from ..cron.update_notion_meals import update_notion_meals
-from ..deps.database import get_db
+from ..core.analytics import MealSlot, dish_analytics, dish_key
+from ..core.config import settings
+from ..core.export import (
+    MEAL_FIELDS,
+    SIMPLE_MEAL_FIELDS,
+    ExportFormat,
+    iter_buffered,
+    iter_csv,
+    iter_gzip,
+    iter_meal_rows,
+    iter_ndjson,
+)
+from ..core.meals import MealsResponse, SwapMode, paginate, simplify, simplify_asked
+from ..core.search import search_index
+from ..cron.update_notion_meals import notion_sync
+from ..deps.conditional import meals_conditional_get, view_conditional_get
+from ..deps.database import get_db, manual_db
 from ..deps.security import token_middleware
-from ..schemas.meal import Meal, MealCreate, MealUpdate, SimpleMeal
+from ..schemas.analytics import DishSuggestion
+from ..schemas.meal import (
+    BulkUpsertResult,
+    DeleteResult,
+    Meal,
+    MealCreate,
+    MealUpdate,
+    SimpleMeal,
+)
+from ..utils.metrics import InstrumentedRoute
 from ..utils.responses import gen_responses
 
 router = APIRouter(
+    route_class=InstrumentedRoute,
     tags=["Meals"],
     dependencies=[Depends(token_middleware)],
     **gen_responses({401: "Missing Token", 403: "Invalid token"}),
@@ -26,86 +50,274 @@ _CustomMealList = List[_CustomMeal]
 
 @router.get(
     "",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMealList,
     summary="Get all meals",
+    **gen_responses({400: "Invalid cursor"}),
 )
 def get_meals(
-    *, db=Depends(get_db), simple=Depends(simplify_asked), pagination=Depends(paginate)
+    *,
+    response: Response,
+    db=Depends(get_db),
+    simple=Depends(simplify_asked),
+    pagination=Depends(paginate),
 ):
-    """Returns all the meals stored in the database."""
-    return simplify(crud.meal.get_multi(db, **pagination), List[SimpleMeal], simple)
+    """Returns the meals stored in the database, ordered by date.
+
+    If there are more meals, the cursors to get the next and previous pages
+    are returned in the `X-Next-Cursor` and `X-Previous-Cursor` headers, to be
+    passed as `after` and `before` respectively.
+    """
+    page = crud.meal.get_page(db, **pagination)
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.previous_cursor:
+        response.headers["X-Previous-Cursor"] = page.previous_cursor
+    return MealsResponse(page.items, simple=simple, response=response)
 
 
 @router.get(
     "/week/current",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMealList,
     summary="Get meals of current week",
 )
-def get_meals_of_current_week(*, db=Depends(get_db), simple=Depends(simplify_asked)):
+def get_meals_of_current_week(
+    *, response: Response, db=Depends(get_db), simple=Depends(simplify_asked)
+):
     """Returns all the meals from current week. Max 7 meals will be returned."""
-    return simplify(crud.meal.get_current_week(db), List[SimpleMeal], simple)
+    meals = crud.meal.get_current_week(db)
+    return MealsResponse(meals, simple=simple, response=response)
 
 
 @router.get(
     "/week/next",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMealList,
     summary="Get meals of next week",
 )
-def get_meals_of_next_week(*, db=Depends(get_db), simple=Depends(simplify_asked)):
+def get_meals_of_next_week(
+    *, response: Response, db=Depends(get_db), simple=Depends(simplify_asked)
+):
     """Returns all the meals from next week. Max 7 meals will be returned."""
-    return simplify(
-        crud.meal.get_week_delta(db, delta_weeks=1), List[SimpleMeal], simple
-    )
+    meals = crud.meal.get_week_delta(db, delta_weeks=1)
+    return MealsResponse(meals, simple=simple, response=response)
 
 
 @router.get(
     "/week/{week}",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMealList,
     summary="Get meals of week",
+    **gen_responses({400: "Invalid week"}),
 )
-def get_meals_of_week(*, week: int, db=Depends(get_db), simple=Depends(simplify_asked)):
-    """Returns all the meals from one specific week. Max 7 meals will be returned."""
-    return simplify(crud.meal.get_week(db, week=week), List[SimpleMeal], simple)
+def get_meals_of_week(
+    *,
+    week: int,
+    response: Response,
+    db=Depends(get_db),
+    simple=Depends(simplify_asked),
+):
+    """Returns all the meals from one week of the current year. Max 7 meals."""
+    meals = crud.meal.get_week(db, week=week)
+    return MealsResponse(meals, simple=simple, response=response)
+
+
+@router.get(
+    "/week/{year}/{week}",
+    dependencies=[Depends(meals_conditional_get)],
+    response_model_exclude_unset=True,
+    response_model=_CustomMealList,
+    summary="Get meals of week of year",
+    **gen_responses({400: "Invalid week"}),
+)
+def get_meals_of_week_of_year(
+    *,
+    year: int,
+    week: int,
+    response: Response,
+    db=Depends(get_db),
+    simple=Depends(simplify_asked),
+):
+    """Returns all the meals from one specific ISO week. Max 7 meals will be returned."""
+    meals = crud.meal.get_week(db, week=week, year=year)
+    return MealsResponse(meals, simple=simple, response=response)
 
 
 @router.get(
     "/today",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMeal,
     summary="Get today meals",
 )
-def get_today_meals(*, db=Depends(get_db), simple=Depends(simplify_asked)):
+def get_today_meals(
+    *, response: Response, db=Depends(get_db), simple=Depends(simplify_asked)
+):
     """Returns today's meals."""
-    return simplify(crud.meal.get_today_or_404(db), SimpleMeal, simple)
+    meal = crud.meal.get_today_or_404(db)
+    return MealsResponse(meal, simple=simple, response=response)
 
 
 @router.get(
     "/tomorrow",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMeal,
     summary="Get tomorrow meals",
 )
-def get_tomorrow_meals(*, db=Depends(get_db), simple=Depends(simplify_asked)):
+def get_tomorrow_meals(
+    *, response: Response, db=Depends(get_db), simple=Depends(simplify_asked)
+):
     """Returns tomorrows's meals."""
-    return simplify(crud.meal.get_tomorrow_or_404(db), SimpleMeal, simple)
+    meal = crud.meal.get_tomorrow_or_404(db)
+    return MealsResponse(meal, simple=simple, response=response)
+
+
+@router.get(
+    "/search",
+    dependencies=[Depends(view_conditional_get(search_index))],
+    response_model=List[SimpleMeal],
+    summary="Search meals",
+)
+def search_meals(
+    *,
+    q: str = Query(..., min_length=1, description="Words (or their beginnings)"),
+    limit: int = Query(20, ge=1, le=1000, description="Max meals to return"),
+):
+    """Returns the meals with dishes containing all the words, most recent first.
+
+    Words match the beginning of the words of the dishes, ignoring case and
+    accents. Lookups are served from an in-memory index.
+    """
+    return search_index.search(q, limit=limit)
+
+
+@router.get(
+    "/suggestions",
+    dependencies=[Depends(view_conditional_get(dish_analytics))],
+    response_model=List[DishSuggestion],
+    summary="Suggest dishes",
+)
+def suggest_dishes(
+    *,
+    date: datetime.date,
+    slot: MealSlot,
+    min_gap: Optional[int] = Query(
+        None, ge=1, description="Min days between repeats (setting if missing)"
+    ),
+    limit: int = Query(10, ge=1, le=1000, description="Max dishes to return"),
+):
+    """Returns dishes eaten before in the slot to plan a day, most overdue first.
+
+    Dishes eaten (in any slot) closer to the date than the minimum gap are
+    skipped. Dishes usually frozen are only suggested for future days, as
+    they must be defrosted the day before. Suggestions are served from an
+    in-memory aggregate.
+    """
+    gaps = {dish_key(k): v for k, v in settings.SUGGESTION_DISH_GAPS.items()}
+    return dish_analytics.suggest(
+        date,
+        slot=slot,
+        min_gap=settings.SUGGESTION_MIN_GAP if min_gap is None else min_gap,
+        gaps=gaps,
+        allow_frozen=date > datetime.date.today(),
+        limit=limit,
+    )
+
+
+def _iter_export(
+    export_format: ExportFormat,
+    fields: Sequence[str],
+    start: Optional[datetime.date],
+    end: Optional[datetime.date],
+    compress: bool,
+) -> Iterator[bytes]:
+    # The stream outlives the request handler, so it has its own session
+    with manual_db() as db:
+        rows = iter_meal_rows(db, start=start, end=end, fields=fields)
+        if export_format == ExportFormat.CSV:
+            chunks = iter_csv(rows, fields)
+        else:
+            chunks = iter_ndjson(rows)
+        chunks = iter_buffered(chunks)
+        if compress:
+            chunks = iter_gzip(chunks)
+        yield from chunks
+
+
+@router.get(
+    "/export",
+    dependencies=[Depends(meals_conditional_get)],
+    response_class=StreamingResponse,
+    summary="Export meals",
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}, "text/csv": {}},
+            "description": "Meals ordered by date, one per line",
+        }
+    },
+)
+def export_meals(  # pylint: disable=too-many-arguments
+    *,
+    response: Response,
+    export_format: ExportFormat = Query(ExportFormat.NDJSON, alias="format"),
+    start: Optional[datetime.date] = Query(
+        None, alias="from", description="First date"
+    ),
+    end: Optional[datetime.date] = Query(
+        None, alias="to", description="Last date (included)"
+    ),
+    compress: bool = Query(False, description="Compress the response with gzip"),
+    simple=Depends(simplify_asked),
+):
+    """Streams the meals between two dates as newline delimited JSON or CSV.
+
+    Meals are read from the database in chunks while the response is sent,
+    so exports of any size use the same memory.
+    """
+    fields = SIMPLE_MEAL_FIELDS if simple else MEAL_FIELDS
+    end = end + datetime.timedelta(days=1) if end and end < datetime.date.max else None
+    media_type = (
+        "text/csv" if export_format == ExportFormat.CSV else "application/x-ndjson"
+    )
+
+    headers = dict(response.headers)
+    headers[
+        "Content-Disposition"
+    ] = f'attachment; filename="meals.{export_format.value}"'
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+
+    return StreamingResponse(
+        _iter_export(export_format, fields, start, end, compress),
+        media_type=media_type,
+        headers=headers,
+    )
 
 
 @router.get(
     "/{date}",
+    dependencies=[Depends(meals_conditional_get)],
     response_model_exclude_unset=True,
     response_model=_CustomMeal,
     summary="Get meal by its date",
     **gen_responses({404: "Not Found"}),
 )
 def get_single_meal(
-    *, date: datetime.date, db=Depends(get_db), simple=Depends(simplify_asked)
+    *,
+    date: datetime.date,
+    response: Response,
+    db=Depends(get_db),
+    simple=Depends(simplify_asked),
 ):
     """Return meal given the date."""
-    return simplify(crud.meal.get_or_404(db, id=date), SimpleMeal, simple)
+    meal = crud.meal.get_cached_or_404(db, id=date)
+    return MealsResponse(meal, simple=simple, response=response)
 
 
 @router.post(
@@ -120,11 +332,10 @@ def create_single_meal(
     meal: MealCreate,
     db=Depends(get_db),
     simple=Depends(simplify_asked),
-    background_tasks: BackgroundTasks,
 ):
     """Create single meal."""
     result = simplify(crud.meal.create(db, obj_in=meal), SimpleMeal, simple)
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
     return result
 
 
@@ -141,13 +352,31 @@ def create_multiple_meals(
     meals: List[MealCreate],
     db=Depends(get_db),
     simple=Depends(simplify_asked),
-    background_tasks: BackgroundTasks,
 ):
     """Create multiple meals."""
     result = simplify(
         crud.meal.create_multiple(db, obj_in=meals), List[SimpleMeal], simple
     )
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
+    return result
+
+
+@router.put(
+    "/bulk",
+    response_model=BulkUpsertResult,
+    response_model_exclude_none=True,
+    summary="Create or update multiple meals",
+)
+def upsert_multiple_meals(
+    *,
+    meals: List[MealCreate],
+    dry_run: bool = Query(False, description="List the changes without saving them"),
+    db=Depends(get_db),
+):
+    """Create multiple meals, replacing the ones that already exist."""
+    result = crud.meal.upsert_multiple(db, obj_in=meals, dry_run=dry_run)
+    if not dry_run and (result.inserted or result.updated):
+        notion_sync.request()
     return result
 
 
@@ -164,7 +393,6 @@ def swap_meals(
     meal_2: datetime.date,
     mode: SwapMode,
     simple=Depends(simplify_asked),
-    background_tasks: BackgroundTasks,
 ):
     """Swaps meal attributes."""
     result = simplify(
@@ -172,7 +400,7 @@ def swap_meals(
         List[SimpleMeal],
         simple,
     )
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
     return result
 
 
@@ -188,13 +416,12 @@ def shift_meals(
     date: datetime.date,
     mode: SwapMode,
     simple=Depends(simplify_asked),
-    background_tasks: BackgroundTasks,
 ):
     """Shifts meals X days to the future."""
     result = simplify(
         crud.meal.shift(db, date=date, mode=mode), List[SimpleMeal], simple
     )
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
     return result
 
 
@@ -211,27 +438,49 @@ def update_meal(
     meal: MealUpdate,
     db=Depends(get_db),
     simple=Depends(simplify_asked),
-    background_tasks: BackgroundTasks,
 ):
     """Update a saved meal."""
     meal_db = crud.meal.get_or_404(db, id=date)
     result = simplify(
         crud.meal.update(db, db_obj=meal_db, obj_in=meal), SimpleMeal, simple
     )
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
     return result
 
 
+@router.delete(
+    "",
+    response_model=DeleteResult,
+    summary="Delete meals between two dates",
+    **gen_responses({400: "Invalid range"}),
+)
+def delete_meals_range(
+    *,
+    start: datetime.date = Query(..., alias="from", description="First date"),
+    end: datetime.date = Query(..., alias="to", description="Last date (included)"),
+    db=Depends(get_db),
+):
+    """Delete all meals between two dates, both included."""
+    if start > end:
+        raise HTTPException(400, "'from' must not be after 'to'")
+
+    end = end + datetime.timedelta(days=1) if end < datetime.date.max else None
+    deleted = crud.meal.remove_range(db, start=start, end=end)
+    if deleted:
+        notion_sync.request()
+    return DeleteResult(deleted=deleted)
+
+
 @router.delete(
     "/week/current",
     response_class=Response,
     status_code=204,
     summary="Delete current week meals",
 )
-def delete_current_week(*, db=Depends(get_db), background_tasks: BackgroundTasks):
+def delete_current_week(*, db=Depends(get_db)):
     """Delete all meals of a week."""
     crud.meal.remove_current_week(db)
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
 
 
 @router.delete(
@@ -239,11 +488,25 @@ def delete_current_week(*, db=Depends(get_db), background_tasks: BackgroundTasks
     response_class=Response,
     status_code=204,
     summary="Delete week meals",
+    **gen_responses({400: "Invalid week"}),
 )
-def delete_week(*, week: int, db=Depends(get_db), background_tasks: BackgroundTasks):
-    """Delete all meals of a week."""
+def delete_week(*, week: int, db=Depends(get_db)):
+    """Delete all meals of an ISO week of the current year."""
     crud.meal.remove_week(db, week=week)
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
+
+
+@router.delete(
+    "/week/{year}/{week}",
+    response_class=Response,
+    status_code=204,
+    summary="Delete week of year meals",
+    **gen_responses({400: "Invalid week"}),
+)
+def delete_week_of_year(*, year: int, week: int, db=Depends(get_db)):
+    """Delete all meals of an ISO week."""
+    crud.meal.remove_week(db, week=week, year=year)
+    notion_sync.request()
 
 
 @router.delete(
@@ -253,9 +516,7 @@ def delete_week(*, week: int, db=Depends(get_db), background_tasks: BackgroundTa
     summary="Delete single meal",
     **gen_responses({404: "Not Found"}),
 )
-def delete_single_meal(
-    *, date: datetime.date, db=Depends(get_db), background_tasks: BackgroundTasks
-):
+def delete_single_meal(*, date: datetime.date, db=Depends(get_db)):
     """Delete single meal."""
     crud.meal.remove(db, id=date)
-    background_tasks.add_task(update_notion_meals)
+    notion_sync.request()
@@ -2,10 +2,11 @@
 
 from fastapi import APIRouter
 
+from ..utils.metrics import InstrumentedRoute
 from ..utils.misc import get_version
 from ..utils.responses import Version
 
-router = APIRouter(tags=["Utilities"])
+router = APIRouter(route_class=InstrumentedRoute, tags=["Utilities"])
 
 
 @router.get("/version", response_model=Version, summary="Get version")
@@ -0,0 +1,196 @@
+"""In-memory statistics of the dishes eaten."""
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date
+from enum import Enum
+from heapq import nlargest
+from operator import itemgetter
+from typing import Dict, List, Mapping, Optional
+
+from .config import settings
+from .listeners import MealView
+
+
+class MealSlot(Enum):
+    """Slots of a meal holding a dish."""
+
+    LUNCH_1 = "lunch1"
+    LUNCH_2 = "lunch2"
+    DINNER = "dinner"
+
+
+class DishOrder(Enum):
+    """Orders of the dish statistics."""
+
+    FREQUENCY = "frequency"
+    LAST_EATEN = "last_eaten"
+    STALE = "stale"
+
+
+def dish_key(dish: Optional[str]) -> Optional[str]:
+    """Returns the name grouping the spellings of a dish. Placeholders (N/A,
+    Variable) are not dishes."""
+    if not dish:
+        return None
+    key = " ".join(dish.lower().split())
+    if key in (settings.NULL_STR.lower(), settings.VARIABLE_STR.lower()):
+        return None
+    return key
+
+
+class DishEntry:
+    """Days a dish was eaten, sorted, and how many of them it was frozen."""
+
+    __slots__ = ("dates", "occurrences", "frozen")
+
+    def __init__(self):
+        self.dates: List[date] = []
+        self.occurrences: Dict[date, int] = {}
+        self.frozen = 0
+
+    def add(self, day: date, frozen: bool):
+        """Adds an occurrence of the dish."""
+        count = self.occurrences.get(day, 0)
+        if not count:
+            if not self.dates or day > self.dates[-1]:
+                self.dates.append(day)
+            else:
+                insort(self.dates, day)
+        self.occurrences[day] = count + 1
+        self.frozen += frozen
+
+    def remove(self, day: date, frozen: bool):
+        """Removes an occurrence of the dish."""
+        count = self.occurrences.pop(day)
+        if count > 1:
+            self.occurrences[day] = count - 1
+        else:
+            del self.dates[bisect_left(self.dates, day)]
+        self.frozen -= frozen
+
+    def stats(self, dish: str) -> Dict:
+        """Returns the statistics of the dish, in constant time."""
+        days = len(self.dates)
+        first, last = self.dates[0], self.dates[-1]
+        return {
+            "dish": dish,
+            "days": days,
+            "frozen": self.frozen,
+            "first_eaten": first,
+            "last_eaten": last,
+            "average_gap": (last - first).days / (days - 1) if days > 1 else None,
+        }
+
+
+class DishAnalytics(MealView):
+    """Statistics of every dish, per slot and for any slot.
+
+    Each dish keeps the sorted days it was eaten, so adding or removing a
+    meal costs a binary search and the statistics of a dish are computed from
+    its first and last days and their count.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._slots: Dict[Optional[MealSlot], Dict[str, DishEntry]] = {}
+        self._reset()
+
+    def _reset(self):
+        self._slots = {x: defaultdict(DishEntry) for x in (None, *MealSlot)}
+
+    def _iter_dishes(self, meal: Dict):
+        for slot in MealSlot:
+            key = dish_key(meal[slot.value])
+            if key is not None:
+                yield slot, key, meal[f"{slot.value}_frozen"]
+
+    def _index(self, meal: Dict):
+        for slot, key, frozen in self._iter_dishes(meal):
+            self._slots[slot][key].add(meal["date"], frozen)
+            self._slots[None][key].add(meal["date"], frozen)
+
+    def _unindex(self, meal: Dict):
+        for slot, key, frozen in self._iter_dishes(meal):
+            for entries in (self._slots[slot], self._slots[None]):
+                entries[key].remove(meal["date"], frozen)
+                if not entries[key].dates:
+                    del entries[key]
+
+    def get_stats(
+        self, *, slot: Optional[MealSlot] = None, order=DishOrder.FREQUENCY
+    ) -> List[Dict]:
+        """Returns the statistics of the dishes of a slot (or of any slot).
+
+        Days are counted once even if the dish was eaten in several slots.
+        """
+        with self._lock:
+            stats = [x.stats(dish) for dish, x in self._slots[slot].items()]
+
+        if order == DishOrder.FREQUENCY:
+            stats.sort(key=lambda x: (-x["days"], x["dish"]))
+        elif order == DishOrder.LAST_EATEN:
+            stats.sort(key=lambda x: (x["last_eaten"], x["dish"]), reverse=True)
+        else:
+            stats.sort(key=lambda x: (x["last_eaten"], x["dish"]))
+        return stats
+
+    def get_dish(self, dish: str, *, slot: Optional[MealSlot] = None) -> Optional[Dict]:
+        """Returns the statistics of a dish, if it was ever eaten."""
+        key = dish_key(dish)
+        with self._lock:
+            entry = self._slots[slot].get(key)
+            return entry.stats(key) if entry else None
+
+    def suggest(
+        self,
+        day: date,
+        *,
+        slot: MealSlot,
+        min_gap: int,
+        gaps: Mapping[str, int],
+        allow_frozen: bool,
+        limit: int,
+    ) -> List[Dict]:  # pylint: disable=too-many-arguments
+        """Returns the dishes of a slot not eaten (in any slot) closer to a day
+        than their minimum gap, most overdue first. Dishes planned that day
+        are never returned.
+
+        A dish is overdue by the days to its nearest meal divided by its
+        average gap. Dishes eaten a single day have no rhythm and go last.
+        Dishes usually frozen are skipped unless `allow_frozen`.
+        """
+        candidates = []
+        with self._lock:
+            for key, entry in self._slots[slot].items():
+                frozen = entry.frozen * 2 >= len(entry.dates)
+                if frozen and not allow_frozen:
+                    continue
+
+                dates = self._slots[None][key].dates
+                idx = bisect_left(dates, day)
+                previous = dates[idx - 1] if idx else None
+                following = dates[idx] if idx < len(dates) else None
+                days_apart = min(
+                    abs((x - day).days) for x in (previous, following) if x
+                )
+                # Already planned that day, whatever the gap
+                if not days_apart or days_apart < gaps.get(key, min_gap):
+                    continue
+
+                gap = self._slots[None][key].stats(key)["average_gap"]
+                rank = (gap is not None, days_apart / gap if gap else 0, days_apart)
+                suggestion = {
+                    "dish": key,
+                    "last_eaten": previous,
+                    "next_eaten": following,
+                    "days_apart": days_apart,
+                    "average_gap": gap,
+                    "frozen": frozen,
+                }
+                candidates.append((rank, suggestion))
+
+        return [x for _, x in nlargest(limit, candidates, key=itemgetter(0))]
+
+
+dish_analytics = DishAnalytics()
@@ -1,51 +1,246 @@
-"""AWS Operations."""
+"""AWS Operations.
 
-import tempfile
-from json import dumps
-from typing import List
+Backups are sharded by month or ISO week. A manifest lists every shard with
+the hash of its content, so only the shards whose content changed since the
+last backup are uploaded. Shards are newline delimited JSON, optionally
+compressed with gzip, and are written and read as streams.
+"""
+
+import json
+from datetime import date, datetime, timezone
+from itertools import groupby
+from tempfile import SpooledTemporaryFile
+from typing import Dict, Iterable, Iterator, List, Optional
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
-from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import HTTPException
 from pydantic import parse_raw_as
 
 from ..core.config import settings
 from ..schemas.meal import Meal
+from .export import (
+    Checksum,
+    iter_chunks,
+    iter_gunzip,
+    iter_gzip,
+    iter_lines,
+    iter_ndjson,
+)
+
+MANIFEST_VERSION = 2
+
+# Shards are buffered in memory up to a part, bigger ones spill to disk and
+# are sent as multipart uploads
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_PART_SIZE, multipart_chunksize=MULTIPART_PART_SIZE
+)
+
+
+def get_s3_client():
+    """Returns the S3 client, using the custom endpoint if defined."""
+    return boto3.client("s3", endpoint_url=settings.AWS_ENDPOINT_URL)
+
+
+def get_manifest_key() -> str:
+    """Returns the key of the backup manifest."""
+    return f"{settings.S3_BACKUP_PREFIX}/manifest.json"
+
+
+def get_shard_name(day: date) -> str:
+    """Returns the name of the shard where the meal of a day is stored."""
+    if settings.S3_BACKUP_SHARD_PERIOD == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year:04d}-W{week:02d}"
+    return f"{day.year:04d}-{day.month:02d}"
+
+
+def get_shard_key(shard: str) -> str:
+    """Returns the key of a shard."""
+    extension = "ndjson.gz" if settings.S3_BACKUP_GZIP else "ndjson"
+    period = settings.S3_BACKUP_SHARD_PERIOD
+    return f"{settings.S3_BACKUP_PREFIX}/{period}/{shard}.{extension}"
+
+
+def open_object(s3, key: str):
+    """Returns the streaming body of an object, or None if it doesn't exist."""
+    try:
+        response = s3.get_object(Bucket=settings.S3_BUCKET_NAME, Key=key)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("NoSuchKey", "NoSuchBucket", "404"):
+            return None
+        raise
+    return response["Body"]
+
+
+def get_object(s3, key: str) -> Optional[bytes]:
+    """Returns the content of an object, or None if it doesn't exist."""
+    body = open_object(s3, key)
+    if body is None:
+        return None
+    return body.read()
+
+
+def get_manifest(s3) -> Optional[Dict]:
+    """Returns the manifest of the last backup, if any."""
+    data = get_object(s3, get_manifest_key())
+    if data is None:
+        return None
+    return json.loads(data)
+
+
+def iter_meals() -> Iterator[Meal]:
+    """Yields the meals saved in AWS sorted by date, reading the backup as a
+    stream.
+
+    Each shard is read (into memory, or to disk if it's bigger than
+    MULTIPART_PART_SIZE) and checked against the manifest before yielding
+    any of its meals, so a corrupted shard is never restored.
+    """
+    s3 = get_s3_client()
+    manifest = get_manifest(s3)
+    if manifest is None:
+        yield from get_legacy_meals(s3)
+        return
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise HTTPException(
+            500, f"Unsupported backup version: {manifest.get('version')}"
+        )
+
+    for shard, info in sorted(manifest["shards"].items()):
+        body = open_object(s3, info["key"])
+        if body is None:
+            raise HTTPException(500, f"Backup shard {shard} not found")
+
+        chunks = iter_chunks(body)
+        if info["compression"] == "gzip":
+            chunks = iter_gunzip(chunks)
+
+        with SpooledTemporaryFile(max_size=MULTIPART_PART_SIZE) as fp:
+            checksum = Checksum()
+            for line in checksum.feed(iter_lines(chunks)):
+                fp.write(line)
+
+            if checksum.rows != info["rows"] or checksum.sha256 != info["sha256"]:
+                raise HTTPException(500, f"Backup shard {shard} is corrupted")
+
+            fp.seek(0)
+            for line in iter_lines(iter_chunks(fp)):
+                yield Meal.parse_raw(line)
 
 
 def get_meals() -> List[Meal]:
     """Returns the meals saved in AWS."""
-    s3 = boto3.client("s3")
-    with tempfile.TemporaryFile() as fp:
-        try:
-            s3.download_fileobj(settings.S3_BUCKET_NAME, settings.S3_FILE_NAME, fp)
-        except ClientError as exc:
-            if "404" in str(exc):
-                raise HTTPException(404, "Meals not found")
-            raise
+    return list(iter_meals())
+
+
+def get_legacy_meals(s3) -> List[Meal]:
+    """Returns the meals saved as a single file, before sharding backups,
+    sorted by date (the file isn't)."""
+    data = get_object(s3, settings.S3_FILE_NAME)
+    if data is None:
+        raise HTTPException(404, "Meals not found")
+    meals = parse_raw_as(List[Meal], data.decode("utf8"))
+    return sorted(meals, key=lambda x: x.id)
+
+
+def save_meals(rows: Iterable[Dict]) -> Dict[str, int]:
+    """Saves meals in AWS, uploading only the shards that changed.
+
+    The rows (as returned by `iter_meal_rows`) must be sorted by date. They
+    are consumed as a stream: only the shard being written is held, and only
+    up to MULTIPART_PART_SIZE in memory.
+
+    Shards are uploaded before the manifest, and obsolete shards (including
+    all of them if the shard period changed) are deleted after it, so the
+    manifest always points to existing shards. Returns the number of rows and
+    of shards uploaded, unchanged and deleted.
+    """
+    s3 = get_s3_client()
+    ensure_bucket(s3)
+    old_shards = (get_manifest(s3) or {}).get("shards", {})
+    stats = {"uploaded": 0, "unchanged": 0, "deleted": 0, "rows": 0}
+    compression = "gzip" if settings.S3_BACKUP_GZIP else None
+
+    backup = Checksum()
+    shards = {}
+    for shard, shard_rows in groupby(rows, lambda x: get_shard_name(x["date"])):
+        checksum = Checksum()
+        with SpooledTemporaryFile(max_size=MULTIPART_PART_SIZE) as fp:
+            chunks = backup.feed(checksum.feed(iter_ndjson(shard_rows)))
+            if compression:
+                chunks = iter_gzip(chunks)
+            for chunk in chunks:
+                fp.write(chunk)
+
+            info = {
+                "key": get_shard_key(shard),
+                "sha256": checksum.sha256,
+                "rows": checksum.rows,
+                "compression": compression,
+            }
+            shards[shard] = info
+
+            if old_shards.get(shard) == info:
+                stats["unchanged"] += 1
+                continue
+
+            fp.seek(0)
+            upload_shard(s3, fp, info)
+            stats["uploaded"] += 1
+
+    stats["rows"] = backup.rows
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "format": "ndjson",
+        "period": settings.S3_BACKUP_SHARD_PERIOD,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "rows": backup.rows,
+        "sha256": backup.sha256,
+        "shards": shards,
+    }
+    s3.put_object(
+        Bucket=settings.S3_BUCKET_NAME,
+        Key=get_manifest_key(),
+        Body=json.dumps(manifest, indent=2, sort_keys=True).encode("utf8"),
+        ContentType="application/json",
+    )
+
+    for shard in old_shards.keys() - shards.keys():
+        s3.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=old_shards[shard]["key"])
+        stats["deleted"] += 1
+
+    return stats
+
+
+def upload_shard(s3, fp, info: Dict):
+    """Uploads a shard, with its row count and checksum as metadata."""
+    content_type = "application/gzip" if info["compression"] else "application/x-ndjson"
+    s3.upload_fileobj(
+        fp,
+        settings.S3_BUCKET_NAME,
+        info["key"],
+        ExtraArgs={
+            "ContentType": content_type,
+            "Metadata": {"rows": str(info["rows"]), "sha256": info["sha256"]},
+        },
+        Config=TRANSFER_CONFIG,
+    )
+
 
-        fp.seek(0)
-        return parse_raw_as(List[Meal], fp.read().decode("utf8"))
-
-
-def save_meals(meals: List[Meal]):
-    """Saves meals in AWS."""
-    menu_json = dumps(jsonable_encoder(meals))
-    s3 = boto3.client("s3")
-    with tempfile.TemporaryFile() as fp:
-        fp.write(menu_json.encode("utf8"))
-        fp.seek(0)
-        try:
-            s3.upload_fileobj(fp, settings.S3_BUCKET_NAME, settings.S3_FILE_NAME)
-        except ClientError as exc:
-            if exc.response["Error"]["Code"] == "NoSuchBucket":
-                create_bucket()
-                return save_meals(meals)
+def ensure_bucket(s3):
+    """Creates the AWS bucket if it doesn't exist."""
+    try:
+        s3.head_bucket(Bucket=settings.S3_BUCKET_NAME)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] not in ("404", "NoSuchBucket"):
             raise
+        create_bucket(s3)
 
 
-def create_bucket():
+def create_bucket(s3):
     """Creates the AWS bucket."""
-    s3 = boto3.client("s3")
     s3.create_bucket(Bucket=settings.S3_BUCKET_NAME)
@@ -0,0 +1,73 @@
+"""Circuit breaker for calls to external services."""
+
+from threading import Lock
+from time import monotonic
+from typing import Optional
+
+
+class CircuitOpenError(Exception):
+    """The circuit is open: calls are rejected without being attempted."""
+
+
+class CircuitBreaker:
+    """Stops calling a failing service for a while.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call is rejected for `reset_timeout` seconds. Then a single trial
+    call is let through (half-open): if it succeeds the circuit closes,
+    otherwise it opens again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, *, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._lock = Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        """Current state of the circuit."""
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if monotonic() - self._opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call must not be attempted."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+
+        raise CircuitOpenError(f"Circuit {self.name!r} is open")
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        """Counts a failure, opening the circuit if needed."""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = monotonic()
+            self._trial_running = False
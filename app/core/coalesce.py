@@ -0,0 +1,114 @@
+"""Coalescing scheduler for background jobs."""
+
+from logging import getLogger
+from threading import Condition, Lock, Timer
+from time import monotonic
+from typing import Callable, Optional
+
+from prometheus_client import Counter
+
+JOB_TRIGGERS = Counter(
+    "coalesced_job_triggers_total", "Runs requested of a coalesced job.", ["job"]
+)
+JOB_COLLAPSED = Counter(
+    "coalesced_job_collapsed_total",
+    "Requests merged into an already pending run of a coalesced job.",
+    ["job"],
+)
+JOB_RUNS = Counter(
+    "coalesced_job_runs_total", "Runs of a coalesced job.", ["job", "result"]
+)
+
+logger = getLogger(__name__)
+
+
+class CoalescingJob:
+    """Runs a function once after a burst of requests.
+
+    The first request marks the job as pending. The function runs when no
+    new request arrives for `quiet_period` seconds, but never later than
+    `max_latency` seconds after the first pending request. At most one run
+    is in flight: requests arriving during a run schedule another one after
+    it finishes.
+    """
+
+    def __init__(
+        self,
+        func: Callable[[], None],
+        *,
+        name: str,
+        quiet_period: float,
+        max_latency: float,
+    ):
+        self.func = func
+        self.name = name
+        self.quiet_period = quiet_period
+        self.max_latency = max_latency
+
+        self._lock = Lock()
+        self._idle = Condition(self._lock)
+        self._timer: Optional[Timer] = None
+        self._token = 0
+        self._pending_since: Optional[float] = None
+        self._running = False
+
+    def request(self):
+        """Marks the job as pending, delaying its run until things calm down."""
+        with self._lock:
+            JOB_TRIGGERS.labels(self.name).inc()
+            now = monotonic()
+            if self._pending_since is None:
+                self._pending_since = now
+            else:
+                JOB_COLLAPSED.labels(self.name).inc()
+
+            if not self._running:
+                self._schedule(now)
+
+    def flush(self):
+        """Runs the job now if it's pending (used on shutdown).
+
+        If a run is in flight, waits for it first: requests made during that
+        run left the job pending again.
+        """
+        with self._lock:
+            self._idle.wait_for(lambda: not self._running)
+            if self._timer is not None:
+                self._timer.cancel()
+            token = self._token = self._token + 1
+        self._run(token)
+
+    def _schedule(self, now: float):
+        """Arms the timer. Must be called holding the lock."""
+        if self._timer is not None:
+            self._timer.cancel()
+
+        deadline = self._pending_since + self.max_latency
+        delay = max(min(self.quiet_period, deadline - now), 0)
+
+        self._token += 1
+        self._timer = Timer(delay, self._run, args=(self._token,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _run(self, token: int):
+        with self._lock:
+            # A cancelled timer may still fire: only the latest one can run
+            if token != self._token or self._running or self._pending_since is None:
+                return
+            self._running = True
+            self._pending_since = None
+            self._timer = None
+
+        try:
+            self.func()
+            JOB_RUNS.labels(self.name, "success").inc()
+        except Exception:  # pylint: disable=broad-except
+            JOB_RUNS.labels(self.name, "error").inc()
+            logger.exception("Error running coalesced job %r", self.name)
+        finally:
+            with self._lock:
+                self._running = False
+                self._idle.notify_all()
+                if self._pending_since is not None:
+                    self._schedule(monotonic())
@@ -1,7 +1,7 @@
 """Config module."""
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import UUID4, BaseSettings, validator
 
@@ -19,17 +19,30 @@ class Settings(BaseSettings):
     ENABLE_PROMETHEUS: bool = False
     PRODUCTION: bool = False
     DISABLE_CRON_INTEGRATION: bool = False
+    CRON_RUN_HISTORY_SIZE: int = 50
 
     # AWS
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     S3_BUCKET_NAME: str
     S3_FILE_NAME: str = "meals.json"
+    S3_BACKUP_PREFIX: str = "backups"
+    S3_BACKUP_SHARD_PERIOD: Literal["month", "week"] = "month"
+    S3_BACKUP_GZIP: bool = True
+    AWS_ENDPOINT_URL: Optional[str] = None
 
     # Notion
     NOTION_ADD_DAY_AFTER_TOMORROW: bool = True
     NOTION_BLOCK_ID: UUID4
     NOTION_KEY: str
+    NOTION_API_URL: str = "https://api.notion.com/v1"
+    NOTION_CONNECT_TIMEOUT: float = 5
+    NOTION_READ_TIMEOUT: float = 30
+    NOTION_MAX_RETRIES: int = 4
+    NOTION_CIRCUIT_FAILURES: int = 5
+    NOTION_CIRCUIT_RESET_TIMEOUT: float = 300
+    NOTION_SYNC_QUIET_PERIOD: float = 5
+    NOTION_SYNC_MAX_LATENCY: float = 30
 
     # Todoist
     TODOIST_PROJECT_ID: int
@@ -41,6 +54,22 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str
     MYSQL_PORT: str
     MYSQL_USER: str
+    DATABASE_PERSISTENT_POOL: bool = True
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 3600
+    DATABASE_POOL_TIMEOUT: float = 30
+    SQL_PROFILING: bool = False
+    SQL_SLOW_QUERY_SECONDS: float = 0.1
+    SQL_REPEATED_QUERY_THRESHOLD: int = 5
+
+    # Cache
+    MEAL_CACHE_SIZE: int = 256
+    MEAL_CACHE_TTL: float = 60
+
+    # Suggestions
+    SUGGESTION_MIN_GAP: int = 7
+    SUGGESTION_DISH_GAPS: Dict[str, int] = {}
 
     # Defined dinamically
     DATABASE_URI: str = ""
@@ -67,6 +96,19 @@ class Settings(BaseSettings):
                 raise ValueError("must have 7 elements (one for each week day)")
         return v
 
+    @validator("SUGGESTION_MIN_GAP")
+    def check_suggestion_min_gap(cls, v):
+        if v < 1:
+            raise ValueError("must be at least 1 day")
+        return v
+
+    @validator("SUGGESTION_DISH_GAPS")
+    def check_suggestion_dish_gaps(cls, v):
+        for dish, gap in v.items():
+            if gap < 1:
+                raise ValueError(f"gap of {dish!r} must be at least 1 day")
+        return v
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,186 @@
+"""Streaming export of meals.
+
+Meals are read from the database in chunks and encoded one line at a time,
+so the memory used doesn't depend on the number of meals exported.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import zlib
+from datetime import date
+from enum import Enum
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..models.meal import Meal
+
+EXPORT_CHUNK_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+WRITE_BUFFER_SIZE = 64 * 1024
+
+MEAL_FIELDS = (
+    "date",
+    "lunch1",
+    "lunch1_frozen",
+    "lunch2",
+    "lunch2_frozen",
+    "dinner",
+    "dinner_frozen",
+)
+SIMPLE_MEAL_FIELDS = ("date", "lunch1", "lunch2", "dinner")
+
+
+class ExportFormat(Enum):
+    """Valid export formats."""
+
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+def meal_columns(fields: Sequence[str] = MEAL_FIELDS) -> List:
+    """Returns the columns of the fields, labelled with the field names."""
+    return [getattr(Meal, "id" if x == "date" else x).label(x) for x in fields]
+
+
+def iter_meal_rows(
+    db: Session,
+    *,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    fields: Sequence[str] = MEAL_FIELDS,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> Iterator[Dict]:
+    """Yields the meals between start (included) and end (excluded) as dicts,
+    ordered by date. `fields` must include the date.
+
+    Each chunk is a range query starting after the last date read (keyset
+    pagination), so it costs the same at any depth. Rows are fetched as plain
+    tuples, bypassing the session's identity map.
+    """
+    query = select(*meal_columns(fields)).order_by(Meal.id).limit(chunk_size)
+    if start is not None:
+        query = query.where(Meal.id >= start)
+    if end is not None:
+        query = query.where(Meal.id < end)
+
+    last = None
+    while True:
+        chunk = query if last is None else query.where(Meal.id > last)
+        rows = db.execute(chunk).all()
+        for row in rows:
+            yield dict(row._mapping)  # pylint: disable=protected-access
+
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1].date
+
+
+def encode_value(value):
+    """Encodes the values json doesn't know about."""
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def iter_ndjson(rows: Iterable[Dict]) -> Iterator[bytes]:
+    """Encodes rows as newline delimited JSON, one line per row."""
+    for row in rows:
+        line = json.dumps(row, default=encode_value, separators=(",", ":"))
+        yield line.encode("utf8") + b"\n"
+
+
+def iter_csv(rows: Iterable[Dict], fields: Sequence[str]) -> Iterator[bytes]:
+    """Encodes rows as CSV, with a header line."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fields, lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode("utf8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf8")
+
+
+def iter_buffered(
+    chunks: Iterable[bytes], size: int = WRITE_BUFFER_SIZE
+) -> Iterator[bytes]:
+    """Joins small chunks into chunks of at least `size` bytes (but the last)."""
+    buffer, buffered = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Compresses a stream with gzip.
+
+    The header has no timestamp, so equal inputs give equal outputs.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Decompresses a gzip stream."""
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    yield decompressor.flush()
+
+
+def iter_chunks(fp: IO[bytes], chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    """Reads a file object in chunks."""
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Splits a stream in lines, keeping the line ends."""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+class Checksum:
+    """Counts and hashes the lines of a stream as they pass through it."""
+
+    def __init__(self):
+        self.rows = 0
+        self._sha256 = hashlib.sha256()
+
+    @property
+    def sha256(self) -> str:
+        """Hex digest of the lines seen so far."""
+        return self._sha256.hexdigest()
+
+    def feed(self, lines: Iterable[bytes]) -> Iterator[bytes]:
+        """Yields the lines, accounting for them."""
+        for line in lines:
+            self.rows += 1
+            self._sha256.update(line)
+            yield line
@@ -0,0 +1,90 @@
+"""Listeners of the writes of meals."""
+
+from bisect import bisect_left, insort
+from datetime import date, datetime, timezone
+from threading import RLock
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+DateRange = Tuple[date, Optional[date]]
+
+
+class MealView:
+    """In-memory view of every meal, kept up to date by `CRUDMeal`.
+
+    Meals are dicts with the fields of `export.MEAL_FIELDS`. Subclasses
+    maintain their own structures in `_index` and `_unindex`, which are
+    called holding the lock.
+
+    Every change bumps the version of the view. The epoch changes on every
+    restart, so a version can't be mistaken for the same version of a
+    previous process.
+    """
+
+    def __init__(self):
+        self._lock = RLock()
+        self._meals: Dict[date, Dict] = {}
+        self._dates: List[date] = []
+        self._epoch = uuid4().hex[:8]
+        self._version = 0
+        self.modified_at = datetime.now(timezone.utc)
+
+    def __len__(self):
+        return len(self._meals)
+
+    def tag(self) -> str:
+        """Returns an identifier of the current version of the view."""
+        return f"{self._epoch}-{self._version}"
+
+    def _bump(self):
+        self._version += 1
+        self.modified_at = datetime.now(timezone.utc)
+
+    def rebuild(self, meals: Iterable[Dict]):
+        """Replaces the whole view with the meals, sorted by date."""
+        with self._lock:
+            self._meals, self._dates = {}, []
+            self._reset()
+            for meal in meals:
+                self._put(meal)
+            self._bump()
+
+    def replace(self, ranges: List[DateRange], meals: List[Dict]):
+        """Replaces the meals between the [start, end) ranges with the meals
+        which now exist in them (any other meal of the ranges was deleted).
+        An end of None means the range has no upper bound."""
+        with self._lock:
+            for start, end in ranges:
+                low = bisect_left(self._dates, start)
+                high = len(self._dates)
+                if end is not None:
+                    high = bisect_left(self._dates, end, low)
+                for day in self._dates[low:high]:
+                    self._unindex(self._meals.pop(day))
+                del self._dates[low:high]
+
+            for meal in meals:
+                self._put(meal)
+            self._bump()
+
+    def _put(self, meal: Dict):
+        day = meal["date"]
+        old = self._meals.get(day)
+        if old is not None:
+            self._unindex(old)
+        elif not self._dates or day > self._dates[-1]:
+            self._dates.append(day)
+        else:
+            insort(self._dates, day)
+
+        self._meals[day] = meal
+        self._index(meal)
+
+    def _reset(self):
+        """Clears the structures of the subclass."""
+
+    def _index(self, meal: Dict):
+        """Adds a meal to the structures of the subclass."""
+
+    def _unindex(self, meal: Dict):
+        """Removes a meal from the structures of the subclass."""
@@ -1,13 +1,19 @@
 """Meals core."""
 
 
+from datetime import date
 from enum import Enum
-from typing import Any, List
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Type
 
 from fastapi import Query
-from pydantic import parse_obj_as
+from pydantic import BaseModel, parse_obj_as
+from starlette.responses import JSONResponse, Response
 
 from ..models.meal import Meal
+from ..schemas.meal import Meal as MealSchema
+from ..schemas.meal import SimpleMeal
+from ..utils.metrics import measure_serialization
 from ..utils.misc import lowercase
 from .config import settings
 
@@ -43,9 +49,23 @@ def simplify_asked(output: OutputEnum = Query(None, description="Simplify output
     return output == OutputEnum.SIMPLE
 
 
-def paginate(skip: int = 0, limit: int = 100):
+def paginate(
+    skip: int = Query(0, ge=0, description="Objects to skip (prefer the cursors)"),
+    limit: int = Query(100, ge=1, description="Max objects to return"),
+    after: Optional[str] = Query(None, description="Return the objects after it"),
+    before: Optional[str] = Query(None, description="Return the objects before it"),
+    start: Optional[date] = Query(None, alias="from", description="First date"),
+    end: Optional[date] = Query(None, alias="to", description="Last date (included)"),
+):  # pylint: disable=too-many-arguments
     """Returns the pagination."""
-    return {"skip": skip, "limit": limit}
+    return {
+        "skip": skip,
+        "limit": limit,
+        "after": after,
+        "before": before,
+        "start": start,
+        "end": end,
+    }
 
 
 def simplify(input_data: Any, simplified_model: Any, simplify_flag: bool):
@@ -55,6 +75,51 @@ def simplify(input_data: Any, simplified_model: Any, simplify_flag: bool):
     return parse_obj_as(simplified_model, input_data)
 
 
+def make_meal_serializer(model: Type[BaseModel]) -> Callable[[Any], Dict[str, Any]]:
+    """Returns a function converting a meal to the dict of a response model.
+
+    Keys are computed once, in the order of the model's fields. Meals are
+    either SQL models or schemas (both have a `date` attribute) read from the
+    database, so their values are trusted and aren't validated again.
+    """
+    keys = tuple(x.alias for x in model.__fields__.values())
+    getter = attrgetter(*keys)
+
+    def serialize(meal: Any) -> Dict[str, Any]:
+        row = dict(zip(keys, getter(meal)))
+        row["date"] = row["date"].isoformat()
+        return row
+
+    return serialize
+
+
+serialize_meal = make_meal_serializer(MealSchema)
+serialize_simple_meal = make_meal_serializer(SimpleMeal)
+
+
+class MealsResponse(JSONResponse):
+    """JSON response of meals read from the database.
+
+    Bypasses the response model: FastAPI would validate every meal again
+    and run it through `jsonable_encoder`. The response model is only kept
+    in the route to document the API.
+    """
+
+    def __init__(self, content: Any, *, simple: bool, response: Response, **kwargs):
+        self.simple = simple
+        # Returning a response discards the one injected in dependencies
+        super().__init__(content, headers=response.headers, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        serialize = serialize_simple_meal if self.simple else serialize_meal
+        with measure_serialization():
+            if isinstance(content, list):
+                content = [serialize(x) for x in content]
+            else:
+                content = serialize(content)
+            return super().render(content)
+
+
 def swap_attrs(obj1: Any, obj2: Any, attrname: str):
     attr1 = getattr(obj1, attrname)
     attr2 = getattr(obj2, attrname)
@@ -63,11 +128,6 @@ def swap_attrs(obj1: Any, obj2: Any, attrname: str):
     setattr(obj2, attrname, attr1)
 
 
-def set_attrs(old: Any, new: Any, attrnames: List[str]):
-    for attr in attrnames:
-        setattr(new, attr, getattr(old, attr))
-
-
 def can_override_meal_from_shift(meal: Meal, attrnames: List[str]) -> bool:
     """Checks if the meal has all the attrs to null.
 
@@ -1,11 +1,32 @@
 """Notion operations"""
 
-from typing import Dict, List
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import perf_counter, sleep
+from typing import Dict, List, Optional
 
 import requests
+from prometheus_client import Counter, Gauge, Histogram
+from requests.adapters import HTTPAdapter
 
+from .circuit_breaker import CircuitBreaker
 from .config import settings
 
+NOTION_REQUEST_SECONDS = Histogram(
+    "notion_request_seconds", "Latency of the requests to the Notion API.", ["method"]
+)
+NOTION_REQUESTS = Counter(
+    "notion_requests_total",
+    "Requests to the Notion API by outcome.",
+    ["method", "status"],
+)
+NOTION_RETRIES = Counter("notion_retries_total", "Retried requests to the Notion API.")
+NOTION_CIRCUIT_OPEN = Gauge(
+    "notion_circuit_open", "1 if calls to Notion are being rejected, 0 otherwise."
+)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 def create_notion_block(content: str, bold=False, italics=False, code=False):
     """Returns the json to create a notion block."""
@@ -26,17 +47,146 @@ def create_notion_block(content: str, bold=False, italics=False, code=False):
     return block
 
 
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Returns the seconds to wait given a Retry-After header."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((date - datetime.now(timezone.utc)).total_seconds(), 0)
+
+
+class NotionClient:
+    """Notion API client.
+
+    Connections are pooled in a session. Requests have connect and read
+    timeouts and are retried with exponential backoff on network errors,
+    429 (honoring Retry-After) and 5xx. Consecutive failures open a circuit
+    breaker, which rejects calls until Notion has had time to recover.
+    """
+
+    def __init__(
+        self,
+        *,
+        base_url: str,
+        token: str,
+        version: str = "2021-08-16",
+        connect_timeout: float,
+        read_timeout: float,
+        max_retries: int,
+        backoff_factor: float,
+        max_backoff: float,
+        breaker: CircuitBreaker,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=4))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=4))
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {token}",
+                "Content-Type": "application/json",
+                "Notion-Version": version,
+            }
+        )
+
+    def get_backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        """Returns the seconds to wait before retrying."""
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.max_backoff)
+        return min(self.backoff_factor * 2**attempt, self.max_backoff)
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Sends a request to the Notion API, raising if it finally fails."""
+        self.breaker.before_call()
+        try:
+            response = self._request_with_retries(method, path, **kwargs)
+        except requests.HTTPError as exc:
+            # Client errors (4xx) don't mean Notion is down
+            if exc.response.status_code in RETRY_STATUS_CODES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            is_open = self.breaker.state == CircuitBreaker.OPEN
+            NOTION_CIRCUIT_OPEN.set(1 if is_open else 0)
+
+        return response
+
+    def _request_with_retries(self, method: str, path: str, **kwargs):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        attempt = 0
+        while True:
+            response, status = None, "error"
+            start = perf_counter()
+            try:
+                response = self.session.request(
+                    method, url, timeout=self.timeout, **kwargs
+                )
+                status = str(response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(
+                    f"{response.status_code} returned by Notion", response=response
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                status, error = exc.__class__.__name__, exc
+            finally:
+                NOTION_REQUEST_SECONDS.labels(method).observe(perf_counter() - start)
+                NOTION_REQUESTS.labels(method, status).inc()
+
+            if attempt >= self.max_retries:
+                raise error
+
+            NOTION_RETRIES.inc()
+            sleep(self.get_backoff(attempt, response))
+            attempt += 1
+
+    def update_block(self, block_id: str, data: Dict) -> Dict:
+        """Updates a block."""
+        return self.request("PATCH", f"blocks/{block_id}", json=data).json()
+
+
+notion = NotionClient(
+    base_url=settings.NOTION_API_URL,
+    token=settings.NOTION_KEY,
+    connect_timeout=settings.NOTION_CONNECT_TIMEOUT,
+    read_timeout=settings.NOTION_READ_TIMEOUT,
+    max_retries=settings.NOTION_MAX_RETRIES,
+    backoff_factor=0.5,
+    max_backoff=60,
+    breaker=CircuitBreaker(
+        name="notion",
+        failure_threshold=settings.NOTION_CIRCUIT_FAILURES,
+        reset_timeout=settings.NOTION_CIRCUIT_RESET_TIMEOUT,
+    ),
+)
+
+
 def update_notion_text(blocks: List[Dict]):
     """Updates the notion text via its API."""
-    headers = {
-        "Authorization": f"Bearer {settings.NOTION_KEY}",
-        "Content-Type": "application/json",
-        "Notion-Version": "2021-08-16",
-    }
-
-    response = requests.patch(
-        f"https://api.notion.com/v1/blocks/{settings.NOTION_BLOCK_ID}",
-        json={"type": "paragraph", "paragraph": {"text": blocks}},
-        headers=headers,
+    notion.update_block(
+        str(settings.NOTION_BLOCK_ID),
+        {"type": "paragraph", "paragraph": {"text": blocks}},
     )
-    response.raise_for_status()
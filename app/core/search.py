@@ -0,0 +1,93 @@
+"""In-memory search of meals by their dishes."""
+
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import date
+from heapq import nlargest
+from typing import Dict, List, Optional, Set
+
+from .config import settings
+from .listeners import MealView
+
+DISH_FIELDS = ("lunch1", "lunch2", "dinner")
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """Lowercases a text and removes its accents."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(x for x in decomposed if not unicodedata.combining(x))
+
+
+def tokenize(text: Optional[str]) -> Set[str]:
+    """Returns the words of a dish. Placeholders (N/A, Variable) have none."""
+    if not text:
+        return set()
+    placeholders = (settings.NULL_STR.lower(), settings.VARIABLE_STR.lower())
+    if text.strip().lower() in placeholders:
+        return set()
+    return set(_WORD.findall(normalize(text)))
+
+
+class MealSearchIndex(MealView):
+    """Inverted index of the words of the dishes.
+
+    Maps every word to the dates of the meals containing it. Words are also
+    kept sorted, so the words starting with a prefix are a contiguous slice
+    found with a binary search.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._postings: Dict[str, Set[date]] = defaultdict(set)
+        self._words: List[str] = []
+
+    def _reset(self):
+        self._postings = defaultdict(set)
+        self._words = []
+
+    def _index(self, meal: Dict):
+        for word in set().union(*(tokenize(meal[x]) for x in DISH_FIELDS)):
+            dates = self._postings[word]
+            if not dates:
+                self._words.insert(bisect_left(self._words, word), word)
+            dates.add(meal["date"])
+
+    def _unindex(self, meal: Dict):
+        for word in set().union(*(tokenize(meal[x]) for x in DISH_FIELDS)):
+            dates = self._postings[word]
+            dates.discard(meal["date"])
+            if not dates:
+                del self._postings[word]
+                del self._words[bisect_left(self._words, word)]
+
+    def _match(self, prefix: str) -> Set[date]:
+        """Returns the dates of the meals with a word starting with prefix."""
+        dates: Set[date] = set()
+        for idx in range(bisect_left(self._words, prefix), len(self._words)):
+            word = self._words[idx]
+            if not word.startswith(prefix):
+                break
+            dates |= self._postings[word]
+        return dates
+
+    def search(self, query: str, *, limit: int) -> List[Dict]:
+        """Returns the most recent meals with a word starting with each of the
+        words of the query, ignoring case and accents."""
+        prefixes = tokenize(query)
+        if not prefixes:
+            return []
+
+        with self._lock:
+            # Rarest words first, to keep the intersection small
+            matches = sorted((self._match(x) for x in prefixes), key=len)
+            dates = matches[0].intersection(*matches[1:])
+            return [
+                {"date": x, **{k: self._meals[x][k] for k in DISH_FIELDS}}
+                for x in nlargest(limit, dates)
+            ]
+
+
+search_index = MealSearchIndex()
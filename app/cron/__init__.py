@@ -3,4 +3,4 @@
 from .backup_database import backup_database
 from .base import scheduler
 from .check_frozen_meals import check_frozen_meals
-from .update_notion_meals import update_notion_meals
+from .update_notion_meals import notion_sync, update_notion_meals
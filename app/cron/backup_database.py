@@ -1,22 +1,20 @@
 """Backup database cron script."""
 
-from typing import List
-
-from pydantic import parse_obj_as
-
-from .. import crud
 from ..core.aws import save_meals
+from ..core.export import iter_meal_rows
 from ..deps.database import manual_db
-from ..schemas.meal import Meal
 from .base import scheduler
 
 
 # Should fire everyday at 02:08
 @scheduler.scheduled_job("cron", id="backup-database", hour="2", minute="08")
-def backup_database():
-    """Backup database to AWS."""
+def backup_database() -> int:
+    """Backup database to AWS. Returns the meals saved."""
     with manual_db() as db:
-        meals = crud.meal.get_multi(db, limit=1000)
+        stats = save_meals(iter_meal_rows(db))
 
-    meals = parse_obj_as(List[Meal], meals)
-    save_meals(meals)
+    print(
+        f"Backup of {stats['rows']} meals: {stats['uploaded']} shards uploaded, "
+        f"{stats['unchanged']} unchanged, {stats['deleted']} deleted"
+    )
+    return stats["rows"]
@@ -2,6 +2,8 @@
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
+from .history import JOB_EVENTS, run_history
+
 scheduler = BackgroundScheduler(
     {
         "apscheduler.jobstores.default": {
@@ -21,3 +23,4 @@ scheduler = BackgroundScheduler(
         "apscheduler.timezone": "Europe/Madrid",
     }
 )
+scheduler.add_listener(run_history.on_event, JOB_EVENTS)
@@ -9,18 +9,20 @@ from .base import scheduler
 
 # Should fire everyday at 19:00
 @scheduler.scheduled_job("cron", id="check-frozen-meals", hour="19", minute="0")
-def check_frozen_meals():
-    """Checks if tomorrow something frozen is on the menu."""
+def check_frozen_meals() -> int:
+    """Checks if tomorrow something frozen is on the menu. Returns the meals
+    checked."""
     with manual_db() as db:
         meal_db = crud.meal.get_tomorrow(db)
 
     if not meal_db:
-        return
+        return 0
 
     meal = Meal.from_orm(meal_db)
 
     if not meal.frozen:
-        return
+        return 1
 
     text = f"Descongelar: {', '.join(meal.frozen)}"
     add_task(text, due="today 21:30", priority=4)
+    return 1
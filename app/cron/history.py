@@ -0,0 +1,148 @@
+"""Instrumentation and run history of the cron jobs.
+
+Runs of the scheduler are recorded from its events, and runs launched from
+the API by `run_job`. Jobs may return the number of meals they processed.
+"""
+
+from collections import deque
+from datetime import datetime, timezone
+from threading import Lock
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from apscheduler.events import (
+    EVENT_JOB_ERROR,
+    EVENT_JOB_EXECUTED,
+    EVENT_JOB_MISSED,
+    EVENT_JOB_SUBMITTED,
+)
+from prometheus_client import Counter, Gauge, Histogram
+
+from ..core.config import settings
+
+JOB_EVENTS = (
+    EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+)
+
+CRON_JOB_SECONDS = Histogram(
+    "cron_job_seconds",
+    "Duration of the runs of a cron job.",
+    ["job"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 600, 1800),
+)
+CRON_JOB_RUNS = Counter(
+    "cron_job_runs_total", "Runs of a cron job by result.", ["job", "result"]
+)
+CRON_JOB_LAST_RUN = Gauge(
+    "cron_job_last_run_timestamp_seconds",
+    "Time the last run of a cron job finished, by result.",
+    ["job", "result"],
+)
+CRON_JOB_ROWS = Gauge(
+    "cron_job_last_run_rows", "Meals processed by the last run of a cron job.", ["job"]
+)
+
+
+class RunHistory:
+    """Last runs of every job, newest first, up to `size` per job."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._runs: Dict[str, Deque[Dict]] = {}
+        self._started: Dict[Tuple[str, datetime], float] = {}
+        self._lock = Lock()
+
+    def get_runs(self, job: str, limit: Optional[int] = None) -> List[Dict]:
+        """Returns the last runs of a job, newest first."""
+        with self._lock:
+            runs = list(self._runs.get(job, ()))
+        return runs[:limit]
+
+    def record(
+        self,
+        job: str,
+        *,
+        trigger: str,
+        result: str,
+        scheduled_at: Optional[datetime] = None,
+        duration: Optional[float] = None,
+        rows: Optional[int] = None,
+        error: Optional[str] = None,
+    ):  # pylint: disable=too-many-arguments
+        """Saves a run of a job and exports it to prometheus."""
+        finished_at = datetime.now(timezone.utc)
+        CRON_JOB_RUNS.labels(job, result).inc()
+        CRON_JOB_LAST_RUN.labels(job, result).set(finished_at.timestamp())
+        if duration is not None:
+            CRON_JOB_SECONDS.labels(job).observe(duration)
+        if rows is not None:
+            CRON_JOB_ROWS.labels(job).set(rows)
+
+        run = {
+            "trigger": trigger,
+            "result": result,
+            "scheduled_at": scheduled_at,
+            "finished_at": finished_at,
+            "duration": duration,
+            "rows": rows,
+            "error": error,
+        }
+        with self._lock:
+            self._runs.setdefault(job, deque(maxlen=self.size)).appendleft(run)
+
+    def on_event(self, event):
+        """Listener of the job events of the scheduler."""
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = monotonic()
+            with self._lock:
+                for run_time in event.scheduled_run_times:
+                    self._started[event.job_id, run_time] = now
+            return
+
+        if event.code == EVENT_JOB_MISSED:
+            self.record(
+                event.job_id,
+                trigger="scheduler",
+                result="misfire",
+                scheduled_at=event.scheduled_run_time,
+            )
+            return
+
+        with self._lock:
+            started = self._started.pop((event.job_id, event.scheduled_run_time), None)
+        failed = event.code == EVENT_JOB_ERROR
+        self.record(
+            event.job_id,
+            trigger="scheduler",
+            result="failure" if failed else "success",
+            scheduled_at=event.scheduled_run_time,
+            duration=monotonic() - started if started is not None else None,
+            rows=event.retval if isinstance(event.retval, int) else None,
+            error=repr(event.exception) if failed else None,
+        )
+
+    def run_job(self, job: str, func: Callable):
+        """Runs a job outside of the scheduler (from the API), recording it."""
+        start = monotonic()
+        try:
+            rows = func()
+        except Exception as exc:
+            self.record(
+                job,
+                trigger="api",
+                result="failure",
+                duration=monotonic() - start,
+                error=repr(exc),
+            )
+            raise
+
+        self.record(
+            job,
+            trigger="api",
+            result="success",
+            duration=monotonic() - start,
+            rows=rows if isinstance(rows, int) else None,
+        )
+
+
+run_history = RunHistory(settings.CRON_RUN_HISTORY_SIZE)
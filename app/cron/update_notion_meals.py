@@ -1,14 +1,25 @@
 """Update notion meals cron sript."""
 
+import json
 from datetime import datetime, timedelta
+from hashlib import sha256
+from typing import Dict, List, Optional
+
+from prometheus_client import Counter
 
 from .. import crud
+from ..core.coalesce import CoalescingJob
 from ..core.config import settings
 from ..core.notion import create_notion_block, update_notion_text
 from ..deps.database import manual_db
 from ..schemas.meal import Meal
 from .base import scheduler
 
+NOTION_HASH_KEY = "notion-meals-hash"
+NOTION_UPDATES = Counter(
+    "notion_meal_updates_total", "Notion meal updates by result.", ["result"]
+)
+
 
 def get_weekday(delta_days: int = 0) -> str:
     """Return the weekday in words given a delta in days."""
@@ -20,22 +31,32 @@ def get_weekday(delta_days: int = 0) -> str:
     return date.strftime("%A")
 
 
+def hash_blocks(blocks: List[Dict]) -> str:
+    """Returns the hash of the blocks rendered in the notion block."""
+    payload = json.dumps(
+        {"block": str(settings.NOTION_BLOCK_ID), "blocks": blocks}, sort_keys=True
+    )
+    return sha256(payload.encode("utf8")).hexdigest()
+
+
 # Should fire everyday at 05:00
 @scheduler.scheduled_job("cron", id="update-notion-meals", hour="5", minute="0")
-def update_notion_meals():
-    """Update meals in notion page."""
+def update_notion_meals() -> Optional[int]:
+    """Update meals in notion page. Returns the meals shown."""
     if not settings.PRODUCTION:
         print("Skipping update-cron-meals (dev)")
-        return
+        return None
 
     with manual_db() as db:
         today_meal = crud.meal.get_today(db)
         tomorrow_meal = crud.meal.get_tomorrow(db)
         dat_meal = crud.meal.get_day_after_tomorrow(db)
+        last_hash = crud.sync_state.get_value(db, id=NOTION_HASH_KEY)
 
     today_meal = Meal.from_orm(today_meal) if today_meal else None
     tomorrow_meal = Meal.from_orm(tomorrow_meal) if tomorrow_meal else None
     dat_meal = Meal.from_orm(dat_meal) if dat_meal else None
+    rows = sum(x is not None for x in (today_meal, tomorrow_meal, dat_meal))
 
     blocks = []
     weekday = get_weekday(0)
@@ -58,6 +79,25 @@ def update_notion_meals():
 
     if len(blocks) <= 3:
         print("warning: no blocks detected in cron-script update-notion-meals")
-        return
+        return rows
+
+    # The weekday headers are part of the blocks, so the hash changes every day
+    blocks_hash = hash_blocks(blocks)
+    if blocks_hash == last_hash:
+        NOTION_UPDATES.labels("skipped").inc()
+        return rows
 
     update_notion_text(blocks)
+    NOTION_UPDATES.labels("sent").inc()
+
+    with manual_db() as db:
+        crud.sync_state.set_value(db, id=NOTION_HASH_KEY, value=blocks_hash)
+    return rows
+
+
+notion_sync = CoalescingJob(
+    update_notion_meals,
+    name="update-notion-meals",
+    quiet_period=settings.NOTION_SYNC_QUIET_PERIOD,
+    max_latency=settings.NOTION_SYNC_MAX_LATENCY,
+)
@@ -1,3 +1,4 @@
 """CRUD operations"""
 
 from .crud_meal import meal
+from .crud_sync_state import sync_state
@@ -1,11 +1,15 @@
 """Base CRUD operations."""
 
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import date
-from typing import Generic, List, Optional, Type, TypeVar
+from typing import Any, Dict, Generic, List, NamedTuple, Optional, Type, TypeVar, Union
 
 from fastapi.exceptions import HTTPException
 from pydantic import BaseModel
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import Session
+from sqlalchemy.sql import Insert
 
 from ..db.base_class import Base
 
@@ -17,6 +21,14 @@ _Id = date
 # pylint: disable=redefined-builtin
 
 
+class Page(NamedTuple):
+    """Page of objects, with the cursors to get the adjacent pages."""
+
+    items: List[Any]
+    next_cursor: Optional[str]
+    previous_cursor: Optional[str]
+
+
 class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
     """Base CRUD class."""
 
@@ -25,9 +37,13 @@ class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
         detail = f"{self.model.__name__} with id={id} does not exist"
         raise HTTPException(404, detail)
 
-    def raise_conflict_error(self, id: _Id):
+    def raise_conflict_error(self, id: Union[_Id, List[_Id]]):
         """Raise 409 CONFLICT."""
-        detail = f"{self.model.__name__} with id={id} already exists"
+        if isinstance(id, list):
+            ids = ", ".join(str(x) for x in id)
+            detail = f"{self.model.__name__} with id in [{ids}] already exist"
+        else:
+            detail = f"{self.model.__name__} with id={id} already exists"
         raise HTTPException(409, detail)
 
     def __init__(self, model: Type[Model]):
@@ -50,10 +66,88 @@ class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
             return obj
         return self.raise_not_found_error(id=id)
 
-    def get_multi(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[Model]:
-        """Get multiple objects."""
+    def get_multi(  # pylint: disable=too-many-arguments
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after: Optional[_Id] = None,
+        before: Optional[_Id] = None,
+        start: Optional[_Id] = None,
+        end: Optional[_Id] = None,
+    ) -> List[Model]:
+        """Get multiple objects, ordered by id.
+
+        `after` and `before` (excluded) are keyset cursors and `start` and
+        `end` (included) limit the range of ids. All of them are range
+        conditions on the primary key, so the database seeks to the first
+        row instead of scanning and discarding the previous ones like `skip`
+        does. With `before`, the objects just before it are returned.
+        """
+        query = db.query(self.model)
+        if start is not None:
+            query = query.filter(self.model.id >= start)
+        if end is not None:
+            query = query.filter(self.model.id <= end)
+        if after is not None:
+            query = query.filter(self.model.id > after)
+        if before is None:
+            return query.order_by(self.model.id).offset(skip).limit(limit).all()
+
+        query = query.filter(self.model.id < before).order_by(self.model.id.desc())
+        return query.offset(skip).limit(limit).all()[::-1]
+
+    def get_page(
+        self,
+        db: Session,
+        *,
+        limit: int = 100,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        **kwargs,
+    ) -> Page:
+        """Get a page of objects using opaque cursors.
+
+        Arguments are the same as `get_multi`, but `after` and `before` are
+        cursors returned in a previous page.
+        """
+        if after is not None and before is not None:
+            raise HTTPException(400, "Can't paginate after and before a cursor")
+
+        after_id = self.decode_cursor(after) if after is not None else None
+        before_id = self.decode_cursor(before) if before is not None else None
+
+        # An extra object tells whether there are more objects past the page
+        items = self.get_multi(
+            db, limit=limit + 1, after=after_id, before=before_id, **kwargs
+        )
+        has_more = len(items) > limit
+        if has_more:
+            items = items[1:] if before is not None else items[:-1]
+        if not items:
+            return Page(items, None, None)
+
+        more_after = has_more if before is None else True
+        more_before = has_more if before is not None else after is not None
+        return Page(
+            items,
+            self.encode_cursor(items[-1].id) if more_after else None,
+            self.encode_cursor(items[0].id) if more_before else None,
+        )
+
+    @staticmethod
+    def encode_cursor(id: _Id) -> str:
+        """Returns the opaque cursor pointing to an id."""
+        return urlsafe_b64encode(id.isoformat().encode("utf8")).decode("utf8")
 
-        return db.query(self.model).offset(skip).limit(limit).all()
+    @staticmethod
+    def decode_cursor(cursor: str) -> _Id:
+        """Returns the id a cursor points to, or raises 400 BAD REQUEST."""
+        try:
+            return date.fromisoformat(urlsafe_b64decode(cursor).decode("utf8"))
+        except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+            raise HTTPException(400, "Invalid cursor") from exc
 
     def create(
         self, db: Session, *, obj_in: CreateSchema, commit_refresh=True
@@ -89,6 +183,32 @@ class CRUDBase(Generic[Model, CreateSchema, UpdateSchema]):
         db.refresh(db_obj)
         return db_obj
 
+    def upsert_statement(self, db: Session, rows: List[Dict[str, Any]]) -> Insert:
+        """Returns a multi-row INSERT that updates the rows that already exist.
+
+        Rows are keyed by attribute name. Uses the native upsert of the
+        dialect: ON DUPLICATE KEY UPDATE or ON CONFLICT DO UPDATE.
+        """
+        table = self.model.__table__
+        columns = self.model.__mapper__.columns
+        values = [{columns[k].name: v for k, v in row.items()} for row in rows]
+        updated = [x.name for x in table.columns if not x.primary_key]
+
+        dialect = db.get_bind().dialect.name
+        if dialect == "mysql":
+            stmt = mysql.insert(table).values(values)
+            return stmt.on_duplicate_key_update({x: stmt.inserted[x] for x in updated})
+
+        if dialect in ("postgresql", "sqlite"):
+            module = postgresql if dialect == "postgresql" else sqlite
+            stmt = module.insert(table).values(values)
+            return stmt.on_conflict_do_update(
+                index_elements=[x.name for x in table.primary_key.columns],
+                set_={x: stmt.excluded[x] for x in updated},
+            )
+
+        raise NotImplementedError(f"Upsert is not supported in {dialect}")
+
     def remove(self, db: Session, *, id: _Id) -> None:
         """Remove an object."""
         obj = self.get_or_404(db, id=id)
@@ -0,0 +1,101 @@
+"""In-process read cache for meals."""
+
+from collections import OrderedDict
+from datetime import date
+from threading import RLock
+from time import monotonic
+from typing import Any, Dict, Tuple
+
+from prometheus_client import Counter, Gauge
+
+CACHE_HITS = Counter("meal_cache_hits_total", "Meal cache hits.", ["kind"])
+CACHE_MISSES = Counter("meal_cache_misses_total", "Meal cache misses.", ["kind"])
+CACHE_EVICTIONS = Counter(
+    "meal_cache_evictions_total", "Meal cache entries evicted.", ["reason"]
+)
+CACHE_SIZE = Gauge("meal_cache_size", "Meal cache entries stored.")
+
+MISSING = object()
+
+_Key = Tuple[date, date]
+
+
+def _kind(key: _Key) -> str:
+    return "day" if (key[1] - key[0]).days == 1 else "range"
+
+
+class MealCache:
+    """Bounded LRU cache with TTL whose keys are [start, end) date ranges.
+
+    Entries are invalidated by date, so any write touching a date drops every
+    entry whose range contains it. Keys are absolute dates, so "today" moves
+    to a new key at midnight instead of serving yesterday's entry.
+    """
+
+    def __init__(self, *, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._data: "OrderedDict[_Key, Tuple[float, Any]]" = OrderedDict()
+        self._lock = RLock()
+        self._hits = 0
+        self._misses = 0
+        CACHE_SIZE.set_function(lambda: len(self._data))
+
+    def get(self, start: date, end: date) -> Any:
+        """Returns the value stored for the range, or MISSING."""
+        key = (start, end)
+        with self._lock:
+            entry = self._data.get(key, None)
+            if entry is not None and monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                CACHE_EVICTIONS.labels("ttl").inc()
+                entry = None
+
+            if entry is None:
+                self._misses += 1
+                CACHE_MISSES.labels(_kind(key)).inc()
+                return MISSING
+
+            self._data.move_to_end(key)
+            self._hits += 1
+            CACHE_HITS.labels(_kind(key)).inc()
+            return entry[1]
+
+    def put(self, start: date, end: date, value: Any, generation: int):
+        """Stores a value read while the cache was at the given generation.
+
+        If a write invalidated the cache after the value was read, the value
+        may be stale and is discarded.
+        """
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            self._data[(start, end)] = (monotonic(), value)
+            self._data.move_to_end((start, end))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                CACHE_EVICTIONS.labels("size").inc()
+
+    def invalidate(self, start: date, end: date):
+        """Drops every entry overlapping the [start, end) range."""
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._data if k[0] < end and start < k[1]]:
+                del self._data[key]
+                CACHE_EVICTIONS.labels("write").inc()
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self.generation += 1
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit and miss counters."""
+        with self._lock:
+            return {"hits": self._hits, "misses": self._misses, "size": len(self._data)}
@@ -1,38 +1,270 @@
 """Meals CRUD operations."""
 
 import datetime
-from typing import List
+from collections import Counter
+from threading import Lock
+from time import monotonic
+from typing import List, Optional, Sequence, Set, Tuple
 
-from sqlalchemy import func
+from fastapi.exceptions import HTTPException
+from sqlalchemy import and_, select
 from sqlalchemy.orm.session import Session
 
+from ..core.analytics import dish_analytics
 from ..core.config import settings
-from ..core.meals import (
-    NULL_MAP,
-    SwapMode,
-    can_override_meal_from_shift,
-    set_attrs,
-    swap_attrs,
-)
+from ..core.export import iter_meal_rows, meal_columns
+from ..core.listeners import DateRange, MealView
+from ..core.meals import NULL_MAP, SwapMode, can_override_meal_from_shift, swap_attrs
+from ..core.search import search_index
 from ..crud.base import CRUDBase
 from ..models import Meal
+from ..schemas.meal import BulkUpsertResult
+from ..schemas.meal import Meal as MealSchema
 from ..schemas.meal import MealCreate, MealUpdate
-from ..utils.misc import get_current_week
+from ..utils.misc import get_iso_week, get_week_range
+from .cache import MISSING, MealCache
+from .revision import Revision
+
+_ONE_DAY = datetime.timedelta(days=1)
+UPSERT_CHUNK_SIZE = 500
+SHIFT_FIRST_BATCH_DAYS = 32
+REVISION_KEY = "meal_revision"
+# pylint: disable=redefined-builtin,too-many-public-methods
 
 
 class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
-    """Meal CRUD operations."""
+    """Meal CRUD operations.
+
+    Read methods returning snapshots (get_cached, get_today, get_week...) are
+    served from the cache. Every write method invalidates the dates it
+    touches after committing, which also bumps the table revision and sends
+    the new meals of those dates to the listeners (in-memory views).
+    """
+
+    def __init__(self, model, *, cache: MealCache, listeners: Sequence[MealView] = ()):
+        super().__init__(model)
+        self.cache = cache
+        self.revision = Revision(REVISION_KEY)
+        self._revision_read = -float("inf")
+        self.listeners = list(listeners)
+        self._listeners_lock = Lock()
+
+    def _invalidate(self, db: Session, *dates: datetime.date):
+        """Invalidates the cached entries containing any of the dates."""
+        for date in dates:
+            self.cache.invalidate(date, date + _ONE_DAY)
+        self.revision.bump(db)
+
+        dates = sorted(set(dates))
+        conditions = [
+            self.model.id.in_(dates[idx : idx + UPSERT_CHUNK_SIZE])
+            for idx in range(0, len(dates), UPSERT_CHUNK_SIZE)
+        ]
+        self._notify(db, [(x, x + _ONE_DAY) for x in dates], conditions)
+
+    def _invalidate_range(
+        self, db: Session, start: datetime.date, end: Optional[datetime.date]
+    ):
+        """Invalidates the cached entries overlapping [start, end). If end is
+        None, the range has no upper bound."""
+        self.cache.invalidate(start, end or datetime.date.max)
+        self.revision.bump(db)
+
+        self._notify(db, [(start, end)], [self._range_condition(start, end)])
+
+    def _range_condition(self, start: datetime.date, end: Optional[datetime.date]):
+        if end is None:
+            return self.model.id >= start
+        return and_(self.model.id >= start, self.model.id < end)
+
+    def _notify(self, db: Session, ranges: List[DateRange], conditions: List):
+        """Sends the current meals of the ranges written to the listeners.
+
+        Meals are read after committing, with one query shared by all the
+        listeners. Reading and sending hold a lock, so listeners receive the
+        writes in the order they were read, never a stale one last.
+        """
+        if not self.listeners:
+            return
+
+        with self._listeners_lock:
+            meals = [
+                dict(row._mapping)  # pylint: disable=protected-access
+                for condition in conditions
+                for row in db.execute(select(*meal_columns()).where(condition))
+            ]
+            for listener in self.listeners:
+                listener.replace(ranges, meals)
+
+    def get_revision(self, db: Session) -> Tuple[str, Optional[datetime.datetime]]:
+        """Returns the tag of the table revision and the time of its last write.
+
+        If another process wrote since this one last looked, the cache is
+        cleared and the listeners rebuilt, as they may be stale.
+        """
+        tag, last_modified, changed = self.revision.get(db)
+        self._revision_read = monotonic()
+        if changed:
+            self.cache.clear()
+            self.rebuild_listeners(db)
+        return tag, last_modified
+
+    def get_revision_age(self) -> float:
+        """Returns the seconds since this process last read the revision."""
+        return monotonic() - self._revision_read
+
+    def rebuild_listeners(self, db: Session):
+        """Loads every meal in the listeners (on startup or to repair them).
+
+        The revision is read first, so the listeners hold at least its meals
+        and aren't rebuilt again when it's next read.
+        """
+        if not self.listeners:
+            return
+
+        if self.revision.get(db)[2]:
+            self.cache.clear()
+        with self._listeners_lock:
+            for listener in self.listeners:
+                listener.rebuild(iter_meal_rows(db))
+
+    def _read_through(self, start: datetime.date, end: datetime.date, loader):
+        """Returns the cached value of the range, loading it on a miss."""
+        value = self.cache.get(start, end)
+        if value is not MISSING:
+            return value
+
+        generation = self.cache.generation
+        value = loader()
+        self.cache.put(start, end, value, generation)
+        return value
+
+    def create(self, db: Session, *, obj_in: MealCreate, commit_refresh=True) -> Meal:
+        db_obj = super().create(db, obj_in=obj_in, commit_refresh=commit_refresh)
+        if commit_refresh:
+            self._invalidate(db, db_obj.id)
+        return db_obj
+
+    def get_existing_ids(
+        self, db: Session, *, ids: List[datetime.date]
+    ) -> Set[datetime.date]:
+        """Returns which of the dates already have a meal, using one range query."""
+        if not ids:
+            return set()
+
+        query = db.query(self.model.id).filter(
+            self.model.id >= min(ids), self.model.id <= max(ids)
+        )
+        return {x.id for x in query} & set(ids)
 
     def create_multiple(self, db: Session, *, obj_in: List[MealCreate]) -> List[Meal]:
-        """Create multiple meals."""
-        out = []
-        for obj in obj_in:
-            out.append(self.create(db, obj_in=obj, commit_refresh=False))
+        """Create multiple meals.
+
+        All the conflicts are detected with a single query and reported
+        together. The meals are inserted in a single multi-row statement and,
+        as nothing is generated by the database, returned without refreshing.
+        """
+        rows = [obj.dict() for obj in obj_in]
+        if not rows:
+            return []
+
+        ids = [row["id"] for row in rows]
+        conflicts = self.get_existing_ids(db, ids=ids)
+        conflicts |= {x for x, count in Counter(ids).items() if count > 1}
+        if conflicts:
+            self.raise_conflict_error(id=sorted(conflicts))
 
+        db.bulk_insert_mappings(self.model, rows, render_nulls=True)
         db.commit()
-        for obj in out:
-            db.refresh(obj)
-        return out
+        self._invalidate(db, *ids)
+        return [self.model(**row) for row in rows]
+
+    def update(  # pylint: disable=arguments-differ
+        self, db: Session, *, db_obj: Meal, obj_in: MealUpdate
+    ) -> Meal:
+        db_obj = super().update(db, db_obj=db_obj, obj_in=obj_in)
+        self._invalidate(db, db_obj.id)
+        return db_obj
+
+    def remove(self, db: Session, *, id: datetime.date) -> None:
+        super().remove(db, id=id)
+        self._invalidate(db, id)
+
+    def get_cached(self, db: Session, *, id: datetime.date) -> Optional[MealSchema]:
+        """Get a snapshot of a meal using its date."""
+
+        def load():
+            meal_db = self.get(db, id=id)
+            return MealSchema.from_orm(meal_db) if meal_db else None
+
+        return self._read_through(id, id + _ONE_DAY, load)
+
+    def get_cached_or_404(self, db: Session, *, id: datetime.date) -> MealSchema:
+        """Get a snapshot of a meal or return 404."""
+        obj = self.get_cached(db, id=id)
+        if obj is not None:
+            return obj
+        return self.raise_not_found_error(id=id)
+
+    def upsert_multiple(
+        self, db: Session, *, obj_in: List[MealCreate], dry_run=False
+    ) -> BulkUpsertResult:
+        """Create or update multiple meals.
+
+        Meals are processed in chunks of consecutive dates. For each chunk the
+        stored meals are read with one range query, meals which wouldn't
+        change are skipped and the rest are merged with a single upsert
+        statement. If a date is repeated, the last meal wins.
+
+        The read doesn't lock: the upsert is atomic by itself, and locking
+        the range would take gap locks (MySQL) which make concurrent bulk
+        upserts deadlock. A concurrent write may only make the counts of
+        inserted and updated meals inexact.
+
+        If dry_run is True nothing is written and the result lists the dates
+        that would be inserted or updated.
+        """
+        rows = {row["id"]: row for row in (obj.dict() for obj in obj_in)}
+        inserted, updated, unchanged = [], [], 0
+
+        ids = sorted(rows)
+        for idx in range(0, len(ids), UPSERT_CHUNK_SIZE):
+            chunk = ids[idx : idx + UPSERT_CHUNK_SIZE]
+            existing = {
+                x.id: x
+                for x in db.query(self.model).filter(
+                    self.model.id >= chunk[0], self.model.id <= chunk[-1]
+                )
+            }
+
+            to_write = []
+            for id in chunk:
+                current = existing.get(id)
+                if current is None:
+                    inserted.append(id)
+                elif any(getattr(current, k) != v for k, v in rows[id].items()):
+                    updated.append(id)
+                else:
+                    unchanged += 1
+                    continue
+                to_write.append(rows[id])
+
+            if to_write and not dry_run:
+                db.execute(self.upsert_statement(db, to_write))
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+            self._invalidate(db, *inserted, *updated)
+
+        return BulkUpsertResult(
+            inserted=len(inserted),
+            updated=len(updated),
+            unchanged=unchanged,
+            inserted_dates=inserted if dry_run else None,
+            updated_dates=updated if dry_run else None,
+        )
 
     def get_today_or_404(self, db: Session):
         """Get today's menu or return 404."""
@@ -56,7 +288,7 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
     def get_by_date_delta(self, db: Session, *, delta_days: int):
         """Get menu using a relative time delta."""
         date = (datetime.datetime.now() + datetime.timedelta(days=delta_days)).date()
-        return self.get(db, id=date)
+        return self.get_cached(db, id=date)
 
     def get_today(self, db: Session):
         """Get today's menu."""
@@ -70,19 +302,49 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
         """Get the day after tomorrow's menu."""
         return self.get_by_date_delta(db, delta_days=2)
 
-    def get_week(self, db: Session, *, week: int):
+    @staticmethod
+    def get_week_range(
+        *, week: int, year: Optional[int] = None
+    ) -> Tuple[datetime.date, datetime.date]:
+        """Returns the [start, end) date range of an ISO week.
+
+        If year is not given, the current ISO year is used.
+        """
+        if year is None:
+            year = get_iso_week()[0]
+
+        try:
+            return get_week_range(year, week)
+        except ValueError as exc:
+            raise HTTPException(400, f"Week {week} of {year} does not exist") from exc
+
+    def get_range(self, db: Session, *, start: datetime.date, end: datetime.date):
+        """Get the menus between start (included) and end (excluded)."""
+        return (
+            db.query(self.model)
+            .filter(self.model.id >= start, self.model.id < end)
+            .order_by(self.model.id)
+            .all()
+        )
+
+    def get_week(self, db: Session, *, week: int, year: Optional[int] = None):
         """Get week's menu."""
-        return db.query(self.model).filter(func.weekofyear(self.model.id) == week).all()
+        start, end = self.get_week_range(week=week, year=year)
+
+        def load():
+            meals = self.get_range(db, start=start, end=end)
+            return [MealSchema.from_orm(x) for x in meals]
+
+        return self._read_through(start, end, load)
 
     def get_week_delta(self, db: Session, *, delta_weeks: int):
         """Get week's menu using a relative time delta."""
-        week = get_current_week() + delta_weeks
-        return self.get_week(db, week=week)
+        year, week = get_iso_week(delta_weeks)
+        return self.get_week(db, week=week, year=year)
 
     def get_current_week(self, db: Session):
         """Get current week's menu."""
-        week = get_current_week()
-        return self.get_week(db, week=week)
+        return self.get_week_delta(db, delta_weeks=0)
 
     def swap(
         self,
@@ -91,22 +353,34 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
         date_1: datetime.date,
         date_2: datetime.date,
         mode: SwapMode,
-    ) -> List[Meal]:
-        """Swaps two meals data."""
-        obj1 = self.get_or_404(db, id=date_1)
-        obj2 = self.get_or_404(db, id=date_2)
+    ) -> List[MealSchema]:
+        """Swaps two meals data.
+
+        Both meals are read and locked with a single query, so concurrent
+        swaps and shifts touching them are serialized.
+        """
+        meals = {
+            x.id: x
+            for x in db.query(self.model)
+            .filter(self.model.id.in_([date_1, date_2]))
+            .order_by(self.model.id)
+            .with_for_update()
+        }
+        for date in (date_1, date_2):
+            if date not in meals:
+                self.raise_not_found_error(id=date)
+        obj1, obj2 = meals[date_1], meals[date_2]
 
         attrnames = self.get_attrnames_from_swapmode(mode)
         for attr in attrnames:
             swap_attrs(obj1, obj2, attr)
 
-        db.add(obj1)
-        db.add(obj2)
+        # Snapshots are taken before committing, which would expire the objects
+        result = [MealSchema.from_orm(obj1), MealSchema.from_orm(obj2)]
         db.commit()
-        db.refresh(obj1)
-        db.refresh(obj2)
+        self._invalidate(db, date_1, date_2)
 
-        return [obj1, obj2]
+        return result
 
     @staticmethod
     def get_attrnames_from_swapmode(mode: SwapMode) -> List[str]:
@@ -132,63 +406,133 @@ class CRUDMeal(CRUDBase[Meal, MealCreate, MealUpdate]):
 
         return attrnames
 
-    def shift(self, db: Session, *, date: datetime.date, mode: SwapMode):
-        """Shifts all meals x days to the future."""
-        meal_to_move = self.get(db, id=date)
-        # If there is no meal for that date we don't have to do anything
-        if meal_to_move is None:
-            return []
+    def shift(
+        self, db: Session, *, date: datetime.date, mode: SwapMode
+    ) -> List[MealSchema]:
+        """Shifts all meals x days to the future.
 
+        The shifted values are computed in memory and written back with
+        chunked upserts in a single transaction, holding the locks taken
+        while resolving the chain of meals to move.
+        """
         attrnames = self.get_attrnames_from_swapmode(mode)
-        meals_to_edit = self.get_days_to_shift(db, meal_to_move, attrnames)
+        meals_to_edit = self.get_days_to_shift(db, date, attrnames)
+        # If there is no meal for that date we don't have to do anything
+        if not meals_to_edit:
+            db.rollback()
+            return []
 
-        for meal_to_edit in meals_to_edit:
-            db.refresh(meal_to_edit)
+        columns = self.model.__mapper__.columns.keys()
+        rows = [{k: getattr(x, k) for k in columns} for x in meals_to_edit]
 
-        # Shift all meals
-        meals_to_edit.sort(key=lambda x: x.id, reverse=True)
-        for idx, meal_to_move in enumerate(meals_to_edit):
-            if idx:
-                set_attrs(meals_to_edit[idx], meals_to_edit[idx - 1], attrnames)
+        # Shift all meals, starting from the last one
+        for idx in range(len(rows) - 1, 0, -1):
+            for attr in attrnames:
+                rows[idx][attr] = rows[idx - 1][attr]
 
         # Remove attributes from first meal
         for attr in attrnames:
-            setattr(meal_to_move, attr, NULL_MAP[attr])
+            rows[0][attr] = NULL_MAP[attr]
 
-        db.add_all(meals_to_edit)
+        for idx in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            db.execute(self.upsert_statement(db, rows[idx : idx + UPSERT_CHUNK_SIZE]))
         db.commit()
 
-        meals_to_edit.sort(key=lambda x: x.id)
-        return meals_to_edit
+        last = rows[-1]["id"]
+        self._invalidate_range(db, date, last + _ONE_DAY if last < last.max else None)
+        return [MealSchema.from_orm(self.model(**row)) for row in rows]
 
     def get_days_to_shift(
-        self, db: Session, first_meal: Meal, attrnames: List[str]
+        self, db: Session, date: datetime.date, attrnames: List[str]
     ) -> List[Meal]:
-        """Returns a list of meals to edit after shifting."""
-        next_day_id = first_meal.id + datetime.timedelta(days=1)
-        next_day_meal = self.get(db, id=next_day_id)
-        if next_day_meal is None:
-            new_meal = MealCreate(
-                date=next_day_id, lunch1=settings.NULL_STR, dinner=settings.NULL_STR
+        """Returns the sorted list of meals to edit after shifting.
+
+        The chain starts with the meal of the date and goes on through
+        consecutive days until one can be overridden (or is missing, in which
+        case a new empty meal, not yet saved, ends the chain). It's resolved
+        with forward range queries that lock the rows read, doubling the range
+        until the end of the chain is found. Returns an empty list if there
+        is no meal for the date, and raises a 400 error if the chain would
+        need a day after date.max.
+        """
+        chain: List[Meal] = []
+        expected = date
+        batch_days = SHIFT_FIRST_BATCH_DAYS
+
+        while True:
+            # Inclusive bound, so the last batch can end on date.max
+            last = datetime.date.max
+            if (last - expected).days >= batch_days:
+                last = expected + datetime.timedelta(days=batch_days - 1)
+            meals = (
+                db.query(self.model)
+                .filter(self.model.id >= expected, self.model.id <= last)
+                .order_by(self.model.id)
+                .with_for_update()
             )
-            next_day_meal = self.create(db, obj_in=new_meal)
-            return [first_meal, next_day_meal]
 
-        if can_override_meal_from_shift(next_day_meal, attrnames):
-            return [first_meal, next_day_meal]
-
-        return self.get_days_to_shift(db, next_day_meal, attrnames) + [first_meal]
+            for meal_db in meals:
+                if meal_db.id != expected:
+                    break
+
+                chain.append(meal_db)
+                if len(chain) > 1 and can_override_meal_from_shift(meal_db, attrnames):
+                    return chain
+                if expected == datetime.date.max:
+                    raise HTTPException(400, f"Meals can't be shifted past {expected}")
+                expected += _ONE_DAY
+
+            if expected <= last:
+                break
+            batch_days *= 2
+
+        if not chain:
+            return chain
+
+        # The chain ends in an empty day
+        new_meal = self.model(
+            id=expected,
+            lunch1=settings.NULL_STR,
+            lunch1_frozen=False,
+            lunch2=None,
+            lunch2_frozen=False,
+            dinner=settings.NULL_STR,
+            dinner_frozen=False,
+        )
+        chain.append(new_meal)
+        return chain
+
+    def remove_range(
+        self, db: Session, *, start: datetime.date, end: Optional[datetime.date]
+    ) -> int:
+        """Remove the meals between start (included) and end (excluded, or
+        every meal from start if it's None).
+
+        Executed as a single DELETE in one transaction. Returns the number of
+        meals removed.
+        """
+        count = (
+            db.query(self.model)
+            .filter(self._range_condition(start, end))
+            .delete(synchronize_session=False)
+        )
+        db.commit()
+        self._invalidate_range(db, start, end)
+        return count
 
-    def remove_week(self, db: Session, *, week: int):
+    def remove_week(self, db: Session, *, week: int, year: Optional[int] = None) -> int:
         """Remove meals for the entire week."""
-        meals = self.get_week(db, week=week)
-        for meal_db in meals:
-            self.remove(db, id=meal_db.id)
+        start, end = self.get_week_range(week=week, year=year)
+        return self.remove_range(db, start=start, end=end)
 
-    def remove_current_week(self, db: Session):
+    def remove_current_week(self, db: Session) -> int:
         """Remove current week's meals."""
-        week = get_current_week()
-        self.remove_week(db, week=week)
+        year, week = get_iso_week()
+        return self.remove_week(db, week=week, year=year)
 
 
-meal = CRUDMeal(Meal)
+meal = CRUDMeal(
+    Meal,
+    cache=MealCache(max_size=settings.MEAL_CACHE_SIZE, ttl=settings.MEAL_CACHE_TTL),
+    listeners=[search_index, dish_analytics],
+)
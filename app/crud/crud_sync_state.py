@@ -0,0 +1,29 @@
+"""Sync state CRUD operations."""
+
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy.orm.session import Session
+
+from ..crud.base import CRUDBase
+from ..models import SyncState
+
+# pylint: disable=redefined-builtin
+
+
+class CRUDSyncState(CRUDBase[SyncState, BaseModel, BaseModel]):
+    """Sync state CRUD operations."""
+
+    def get_value(self, db: Session, *, id: str) -> Optional[str]:
+        """Returns the stored value, if any."""
+        obj = self.get(db, id=id)
+        return obj.value if obj else None
+
+    def set_value(self, db: Session, *, id: str, value: str):
+        """Creates or replaces the stored value, with a single upsert (two
+        processes may create it at the same time)."""
+        db.execute(self.upsert_statement(db, [{"id": id, "value": value}]))
+        db.commit()
+
+
+sync_state = CRUDSyncState(SyncState)
@@ -0,0 +1,56 @@
+"""Revision marker of a table."""
+
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy.orm.session import Session
+
+from .crud_sync_state import sync_state
+
+
+class Revision:
+    """Marker of a table bumped on every write, shared by every process
+    (replicas, scripts...) through a row of the sync state table.
+
+    The row stores the time of the last write and a random token, so two
+    writes made at the same time by different processes get different tags.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self._seen: Optional[str] = None
+        self._lock = Lock()
+
+    def bump(self, db: Session):
+        """Marks the table as modified. Must be called after committing the
+        write, so no process can read the new revision with the old data."""
+        now = datetime.now(timezone.utc)
+        value = f"{now.isoformat()}/{uuid4().hex[:8]}"
+        stmt = sync_state.upsert_statement(db, [{"id": self.key, "value": value}])
+        # Out of the session: committing it would expire the objects written
+        with db.get_bind().begin() as conn:
+            conn.execute(stmt)
+        with self._lock:
+            self._seen = value
+
+    def get(self, db: Session) -> Tuple[str, Optional[datetime], bool]:
+        """Returns the tag of the current revision, the time of the last write
+        (None if the table was never written) and whether the revision
+        changed since the last one this process wrote or read.
+
+        The transaction is ended after reading it: otherwise (in REPEATABLE
+        READ) the meals read next would come from a snapshot taken before the
+        cache generation they are stored with, so a concurrent write could be
+        missed and cached as current.
+        """
+        value = sync_state.get_value(db, id=self.key)
+        db.rollback()
+        with self._lock:
+            changed, self._seen = value != self._seen, value
+
+        if value is None:
+            return "0", None, changed
+        last_modified, token = value.split("/")
+        return token, datetime.fromisoformat(last_modified), changed
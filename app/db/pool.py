@@ -0,0 +1,100 @@
+"""Instrumented connection pool."""
+
+import os
+from time import perf_counter
+from typing import Dict
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# pylint: disable=unused-variable
+
+POOL_CHECKOUTS = Counter(
+    "db_pool_checkouts_total", "Connections checked out from the pool."
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total", "Checkouts that gave up waiting for a free connection."
+)
+POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled connection (includes pre-ping).",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5, 30),
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout counts, wait times and timeouts."""
+
+    def connect(self):
+        start = perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(perf_counter() - start)
+
+        POOL_CHECKOUTS.inc()
+        return connection
+
+
+def get_pool_stats(engine: Engine) -> Dict[str, int]:
+    """Returns the current occupation of the engine's pool."""
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+
+class PoolCollector:
+    """Prometheus collector exporting the pool occupation on every scrape."""
+
+    def __init__(self, engine: Engine):
+        self.engine = engine
+
+    def collect(self):
+        for name, value in get_pool_stats(self.engine).items():
+            gauge = GaugeMetricFamily(
+                f"db_pool_{name}", f"Database pool connections ({name})."
+            )
+            gauge.add_metric([], value)
+            yield gauge
+
+
+def register_pool_collector(engine: Engine):
+    """Exports the pool statistics of the engine to prometheus."""
+    REGISTRY.register(PoolCollector(engine))
+
+
+def make_fork_safe(engine: Engine):
+    """Prevents connections inherited from a parent process from being reused.
+
+    APScheduler's process pool forks the server. A forked child must never
+    talk through a socket owned by its parent, so connections are tagged with
+    the pid that opened them and discarded on checkout from any other process.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _tag_pid(dbapi_connection, connection_record):
+        connection_record.info["pid"] = os.getpid()
+
+    @event.listens_for(engine, "checkout")
+    def _check_pid(dbapi_connection, connection_record, connection_proxy):
+        pid = os.getpid()
+        if connection_record.info["pid"] != pid:
+            connection_record.dbapi_connection = None
+            connection_proxy.dbapi_connection = None
+            raise exc.DisconnectionError(
+                f"Connection record belongs to pid {connection_record.info['pid']}, "
+                f"attempting to check out in pid {pid}"
+            )
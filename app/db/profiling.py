@@ -0,0 +1,89 @@
+"""Profiling of the queries sent to the database (development and staging).
+
+Statements are grouped by fingerprint: the statement without its parameters,
+with lists of placeholders (`IN` lists, rows of multi-row inserts) collapsed,
+so the same query with different values or sizes counts as one.
+"""
+
+import re
+from logging import getLogger
+from time import perf_counter
+from typing import List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..core.config import settings
+from .stats import QueryStats, current_query_stats
+
+# pylint: disable=unused-variable,too-many-arguments
+
+logger = getLogger(__name__)
+
+MAX_PARAMETERS_LENGTH = 1000
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_ROW_LIST = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACES = re.compile(r"\s+")
+
+
+def fingerprint(statement: str) -> str:
+    """Returns the structure of a statement, ignoring its parameters."""
+    statement = _SPACES.sub(" ", statement).strip()
+    statement = _PLACEHOLDER_LIST.sub("(...)", statement)
+    return _ROW_LIST.sub("(...)", statement)
+
+
+def get_repeated(stats: QueryStats) -> List[Tuple[str, int]]:
+    """Returns the statements executed SQL_REPEATED_QUERY_THRESHOLD times."""
+    threshold = settings.SQL_REPEATED_QUERY_THRESHOLD
+    return [(k, v) for k, v in stats.statements.most_common() if v >= threshold]
+
+
+def summarize(stats: QueryStats) -> str:
+    """Returns a one line summary of the queries."""
+    return (
+        f"queries={stats.queries}; time_ms={stats.seconds * 1000:.1f}; "
+        f"rows={stats.rows}; repeated={len(get_repeated(stats))}"
+    )
+
+
+def log_repeated(stats: QueryStats):
+    """Logs the statements repeated by a request, a sign of N+1 queries."""
+    repeated = get_repeated(stats)
+    if not repeated:
+        return
+
+    logger.warning(
+        "Repeated statements in %s (%s):\n%s",
+        stats.route or "unknown route",
+        summarize(stats),
+        "\n".join(f"  {count}x {statement}" for statement, count in repeated),
+    )
+
+
+def profile_queries(engine: Engine):
+    """Logs the slow statements of the engine and counts the executions of
+    each statement in the statistics of the current context."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["profile_start"] = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info.pop("profile_start")
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.statements[fingerprint(statement)] += 1
+
+        if elapsed >= settings.SQL_SLOW_QUERY_SECONDS:
+            route = stats.route if stats is not None else None
+            logger.warning(
+                "Slow statement (%.1f ms) in %s: %s\nParameters: %.*s",
+                elapsed * 1000,
+                route or "no request",
+                statement,
+                MAX_PARAMETERS_LENGTH,
+                repr(parameters),
+            )
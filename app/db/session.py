@@ -2,15 +2,36 @@
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from ..core.config import settings
+from .pool import InstrumentedQueuePool, make_fork_safe, register_pool_collector
+from .profiling import profile_queries
+from .stats import track_queries
 
 if "sqlite" in settings.DATABASE_URI:  # noqa
     connect_args = {"check_same_thread": False}
+    pool_args = {}
+elif settings.DATABASE_PERSISTENT_POOL:  # noqa
+    connect_args = {}
+    pool_args = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+    }
 else:  # noqa
     connect_args = {}
+    pool_args = {"poolclass": NullPool}
 
 engine = create_engine(
-    settings.DATABASE_URI, pool_pre_ping=True, connect_args=connect_args
+    settings.DATABASE_URI, pool_pre_ping=True, connect_args=connect_args, **pool_args
 )
+make_fork_safe(engine)
+register_pool_collector(engine)
+track_queries(engine)
+if settings.SQL_PROFILING:  # noqa
+    profile_queries(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -0,0 +1,56 @@
+"""Statistics of the queries sent to the database."""
+
+from collections import Counter
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# pylint: disable=unused-variable,too-many-arguments
+
+
+class QueryStats:
+    """Queries, time spent in them and rows, of a request or task.
+
+    With SQL profiling, the executions of each statement (by fingerprint)
+    are counted too.
+    """
+
+    __slots__ = ("queries", "seconds", "rows", "route", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.route: Optional[str] = None
+        self.statements: Counter = Counter()
+
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def track_queries(engine: Engine):
+    """Adds every query of the engine to the statistics of the current context.
+
+    Rows are the ones reported by the driver: the rows affected by writes and
+    the rows returned by reads, except with SQLite, which doesn't count them.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info["query_start"] = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        elapsed = perf_counter() - conn.info.pop("query_start")
+        stats = current_query_stats.get()
+        if stats is None:
+            return
+
+        stats.queries += 1
+        stats.seconds += elapsed
+        stats.rows += max(cursor.rowcount, 0)
@@ -0,0 +1,114 @@
+"""Conditional request dependencies."""
+
+from datetime import date, datetime, time, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from fastapi import Depends, Request, Response
+from sqlalchemy.orm.session import Session
+
+from .. import crud
+from ..core.config import settings
+from ..core.listeners import MealView
+from .database import get_db, manual_db
+
+
+class NotModified(Exception):
+    """The client's copy of the resource is still valid."""
+
+    def __init__(self, headers: Dict[str, str]):
+        super().__init__()
+        self.headers = headers
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+
+    candidates = [x.strip() for x in if_none_match.split(",")]
+    return etag.removeprefix("W/") in [x.removeprefix("W/") for x in candidates]
+
+
+def _round_up(value: datetime) -> datetime:
+    if value.microsecond:
+        value += timedelta(seconds=1)
+    return value.replace(microsecond=0)
+
+
+def _modified_since(last_modified: datetime, if_modified_since: str) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified > since
+
+
+def _conditional_get(
+    request: Request, response: Response, tag: str, last_write: Optional[datetime]
+):
+    """Adds the ETag and Last-Modified headers of a revision, raising
+    NotModified if the client's copy is still valid.
+
+    Responses depend on the current date (today, current week...), so both
+    validators change at midnight too. Last-Modified has a precision of
+    seconds, so it's rounded up and only sent (and If-Modified-Since only
+    answered) once that second is over: otherwise a later write in the same
+    second would get the same date.
+    """
+    today = date.today()
+    midnight = datetime.combine(today, time()).astimezone(timezone.utc)
+
+    etag = f'W/"{tag}-{today.isoformat()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    last_modified = midnight
+    if last_write is not None:
+        last_modified = max(_round_up(last_write), midnight)
+    if last_modified > datetime.now(timezone.utc):
+        last_modified = None
+    else:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match is not None:
+        if _etag_matches(etag, if_none_match):
+            raise NotModified(headers)
+    elif if_modified_since is not None and last_modified is not None:
+        if not _modified_since(last_modified, if_modified_since):
+            raise NotModified(headers)
+
+    response.headers.update(headers)
+
+
+def meals_conditional_get(
+    request: Request, response: Response, db: Session = Depends(get_db)
+):
+    """Adds the ETag and Last-Modified headers of the meal table.
+
+    Both come from the revision shared by every process, so a write made by
+    another replica also changes them. If the client's copy is still valid,
+    NotModified is raised before the meals are queried.
+    """
+    tag, last_write = crud.meal.get_revision(db)
+    _conditional_get(request, response, tag, last_write)
+
+
+def view_conditional_get(view: MealView) -> Callable[[Request, Response], None]:
+    """Returns a dependency adding the ETag and Last-Modified headers of an
+    in-memory view, so routes served from it don't touch the database.
+
+    The view only receives the writes of this process: the shared revision
+    is checked at most every MEAL_CACHE_TTL seconds (like the cache), and
+    the views are rebuilt if another process wrote.
+    """
+
+    def dependency(request: Request, response: Response):
+        if crud.meal.get_revision_age() > settings.MEAL_CACHE_TTL:
+            with manual_db() as db:
+                crud.meal.get_revision(db)
+        _conditional_get(request, response, view.tag(), view.modified_at)
+
+    return dependency
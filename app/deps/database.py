@@ -2,17 +2,20 @@
 
 from contextlib import contextmanager
 
-from ..db.session import SessionLocal, engine
+from ..db.session import SessionLocal
 
 
 def get_db():
-    """Creates a local database session."""
+    """Creates a local database session.
+
+    Closing the session returns its connection to the engine's pool, so the
+    next request reuses it instead of opening a new one.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
-        engine.dispose()
 
 
 manual_db = contextmanager(get_db)
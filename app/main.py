@@ -4,12 +4,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from starlette_prometheus import PrometheusMiddleware, metrics
 
+from . import crud
 from .api import router as api_router
 from .core.config import settings
-from .cron import scheduler, update_notion_meals
+from .cron import notion_sync, scheduler, update_notion_meals
 from .db.utils import create_db_and_tables
+from .deps.conditional import NotModified
+from .deps.database import manual_db
+from .utils.metrics import RouteStatsMiddleware
 from .utils.misc import get_version
-from .utils.server import catch_errors
+from .utils.server import catch_errors, not_modified
 
 # https://github.com/long2ice/fastapi-cache
 # https://github.com/perdy/starlette-prometheus
@@ -30,14 +34,24 @@ def get_application():
     )
     _app.include_router(api_router)
     _app.add_exception_handler(500, catch_errors)
+    _app.add_exception_handler(NotModified, not_modified)
 
     if settings.ENABLE_PROMETHEUS:
         _app.add_middleware(PrometheusMiddleware)
         _app.add_route("/metrics/", metrics)
 
+    if settings.ENABLE_PROMETHEUS or settings.SQL_PROFILING:
+        _app.add_middleware(
+            RouteStatsMiddleware,
+            metrics=settings.ENABLE_PROMETHEUS,
+            profiling=settings.SQL_PROFILING,
+        )
+
     @_app.on_event("startup")
     def on_startup():
         create_db_and_tables()
+        with manual_db() as db:
+            crud.meal.rebuild_listeners(db)
 
         if not settings.PRODUCTION:
             print(
@@ -54,6 +68,10 @@ def get_application():
 
         update_notion_meals()
 
+    @_app.on_event("shutdown")
+    def on_shutdown():
+        notion_sync.flush()
+
     return _app
 
 
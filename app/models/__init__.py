@@ -1,3 +1,4 @@
 """Models module."""
 
 from .meal import Meal
+from .sync_state import SyncState
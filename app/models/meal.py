@@ -9,16 +9,20 @@ from ..db.base_class import Base
 
 
 class Meal(Base):
-    """SQL model for meals."""
+    """SQL model for meals.
 
-    id = Column(Date(), primary_key=True, index=True)
+    Every query filters and orders by the date (the primary key), and dishes
+    are looked up in memory, so there are no secondary indexes to maintain.
+    """
+
+    id = Column(Date(), primary_key=True)
     date = synonym("id")
 
-    lunch1 = Column("L1", String(100), index=True, nullable=False)
-    lunch1_frozen = Column("L1.frozen", Boolean(), index=True, nullable=False)
+    lunch1 = Column("L1", String(100), nullable=False)
+    lunch1_frozen = Column("L1.frozen", Boolean(), nullable=False)
 
-    lunch2 = Column("L2", String(100), index=True, nullable=True)
-    lunch2_frozen = Column("L2.frozen", Boolean(), index=True, nullable=False)
+    lunch2 = Column("L2", String(100), nullable=True)
+    lunch2_frozen = Column("L2.frozen", Boolean(), nullable=False)
 
-    dinner = Column("D", String(100), index=True, nullable=False)
-    dinner_frozen = Column("D.frozen", Boolean(), index=True, nullable=False)
+    dinner = Column("D", String(100), nullable=False)
+    dinner_frozen = Column("D.frozen", Boolean(), nullable=False)
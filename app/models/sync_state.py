@@ -0,0 +1,17 @@
+"""Sync state database model"""
+
+from sqlalchemy import Column, DateTime, String, func
+
+from ..db.base_class import Base
+
+# pylint: disable=too-few-public-methods
+
+
+class SyncState(Base):
+    """SQL model for the last state pushed to external services."""
+
+    id = Column(String(50), primary_key=True)
+    value = Column(String(255), nullable=False)
+    updated_at = Column(
+        DateTime(), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
@@ -0,0 +1,55 @@
+"""Analytics schemas."""
+
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class DishStats(BaseModel):
+    dish: str
+    days: int
+    frozen: int
+    first_eaten: date
+    last_eaten: date
+    average_gap: Optional[float]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "dish": "lentejas",
+                "days": 12,
+                "frozen": 3,
+                "first_eaten": "2022-01-10",
+                "last_eaten": "2022-12-05",
+                "average_gap": 29.5,
+            }
+        }
+
+
+class DishSuggestion(BaseModel):
+    dish: str
+    last_eaten: Optional[date]
+    next_eaten: Optional[date]
+    days_apart: int
+    average_gap: Optional[float]
+    frozen: bool
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "dish": "lentejas",
+                "last_eaten": "2022-11-20",
+                "next_eaten": None,
+                "days_apart": 45,
+                "average_gap": 29.5,
+                "frozen": False,
+            }
+        }
+
+
+class RebuildResult(BaseModel):
+    meals: int
+
+    class Config:
+        schema_extra = {"example": {"meals": 730}}
@@ -0,0 +1,41 @@
+"""Cron schemas."""
+
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class RunResult(Enum):
+    SUCCESS = "success"
+    FAILURE = "failure"
+    MISFIRE = "misfire"
+
+
+class RunTrigger(Enum):
+    SCHEDULER = "scheduler"
+    API = "api"
+
+
+class CronRun(BaseModel):
+    trigger: RunTrigger
+    result: RunResult
+    scheduled_at: Optional[datetime]
+    finished_at: datetime
+    duration: Optional[float]
+    rows: Optional[int]
+    error: Optional[str]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "trigger": "scheduler",
+                "result": "success",
+                "scheduled_at": "2022-12-05T02:08:00+01:00",
+                "finished_at": "2022-12-05T01:08:01.843201+00:00",
+                "duration": 1.84,
+                "rows": 730,
+                "error": None,
+            }
+        }
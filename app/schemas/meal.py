@@ -11,6 +11,11 @@ from ..core.notion import create_notion_block
 class MealId(BaseModel):
     id: date = Field(alias="date")
 
+    @property
+    def date(self) -> date:
+        """Alias of id, like the synonym of the SQL model."""
+        return self.id
+
 
 class BaseSimpleMeal(BaseModel):
     lunch1: str
@@ -89,3 +94,21 @@ class MealUpdate(BaseMeal):
             if field.name != "lunch2":
                 raise ValueError(f"Field {field.name!r} can't be nullable")
         return v
+
+
+class BulkUpsertResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    inserted_dates: Optional[List[date]] = None
+    updated_dates: Optional[List[date]] = None
+
+    class Config:
+        schema_extra = {"example": {"inserted": 2, "updated": 1, "unchanged": 4}}
+
+
+class DeleteResult(BaseModel):
+    deleted: int
+
+    class Config:
+        schema_extra = {"example": {"deleted": 7}}
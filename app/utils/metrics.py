@@ -0,0 +1,203 @@
+"""Prometheus metrics of the requests, by route."""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Optional
+
+from fastapi.routing import APIRoute
+from prometheus_client import Histogram
+from starlette.background import BackgroundTask
+
+from ..db.profiling import log_repeated, summarize
+from ..db.stats import QueryStats, current_query_stats
+
+LABELS = ["method", "path_template"]
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+REQUEST_DB_QUERIES = Histogram(
+    "request_db_queries",
+    "Database queries sent by a request.",
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+)
+REQUEST_DB_SECONDS = Histogram(
+    "request_db_seconds",
+    "Time spent in database queries by a request.",
+    LABELS,
+    buckets=SECONDS_BUCKETS,
+)
+REQUEST_DB_ROWS = Histogram(
+    "request_db_rows",
+    "Rows returned or written by the database queries of a request.",
+    LABELS,
+    buckets=(0, 1, 7, 31, 100, 500, 1000, 5000, 10000),
+)
+REQUEST_SERIALIZATION_SECONDS = Histogram(
+    "request_serialization_seconds",
+    "Time spent serializing the response of a request.",
+    LABELS,
+    buckets=SECONDS_BUCKETS,
+)
+REQUEST_BACKGROUND_SECONDS = Histogram(
+    "request_background_seconds",
+    "Time spent running the background tasks of a request.",
+    LABELS,
+    buckets=SECONDS_BUCKETS + (30, 120),
+)
+
+
+class RouteStats:
+    """Statistics of the request being processed."""
+
+    __slots__ = ("queries", "serialization", "background", "endpoint_end")
+
+    def __init__(self):
+        self.queries = QueryStats()
+        self.serialization = 0.0
+        self.background: Optional[float] = None
+        self.endpoint_end: Optional[float] = None
+
+
+current_route_stats: ContextVar[Optional[RouteStats]] = ContextVar(
+    "current_route_stats", default=None
+)
+
+
+@contextmanager
+def measure_serialization():
+    """Adds the time spent in the block to the serialization of the request."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_route_stats.get()
+        if stats is not None:
+            stats.serialization += perf_counter() - start
+
+
+def _end_endpoint():
+    stats = current_route_stats.get()
+    if stats is not None:
+        stats.endpoint_end = perf_counter()
+
+
+def _wrap_endpoint(endpoint: Callable) -> Callable:
+    """Records when the endpoint returns, keeping its signature."""
+    if asyncio.iscoroutinefunction(endpoint):
+
+        @wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                _end_endpoint()
+
+        return async_wrapper
+
+    @wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            _end_endpoint()
+
+    return wrapper
+
+
+def _time_background(tasks: BackgroundTask, stats: RouteStats) -> BackgroundTask:
+    async def run():
+        start = perf_counter()
+        try:
+            await tasks()
+        finally:
+            stats.background = perf_counter() - start
+
+    return BackgroundTask(run)
+
+
+class InstrumentedRoute(APIRoute):
+    """Route measuring the serialization of the value returned by the
+    endpoint (validation against the response model and rendering) and its
+    background tasks."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _wrap_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def instrumented_handler(request):
+            stats = current_route_stats.get()
+            if stats is None:
+                return await handler(request)
+
+            stats.queries.route = f"{request.method} {self.path}"
+            response = await handler(request)
+
+            if stats.endpoint_end is not None:
+                stats.serialization += perf_counter() - stats.endpoint_end
+            if response.background is not None:
+                response.background = _time_background(response.background, stats)
+            return response
+
+        return instrumented_handler
+
+
+class RouteStatsMiddleware:
+    """Collects the statistics of every request.
+
+    With `metrics`, they are exported to prometheus labelled with the route
+    of the request. With `profiling`, the queries sent until the response
+    starts are summarized in the `X-SQL-Summary` header, and repeated
+    statements (N+1 queries) are logged once the request has finished.
+    """
+
+    def __init__(self, app, *, metrics: bool, profiling: bool):
+        self.app = app
+        self.metrics = metrics
+        self.profiling = profiling
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RouteStats()
+        route_token = current_route_stats.set(stats)
+        query_token = current_query_stats.set(stats.queries)
+
+        async def send_with_summary(message):
+            if message["type"] == "http.response.start":
+                summary = summarize(stats.queries).encode("latin-1")
+                message["headers"] = [*message["headers"], (b"x-sql-summary", summary)]
+            await send(message)
+
+        try:
+            await self.app(
+                scope, receive, send_with_summary if self.profiling else send
+            )
+        finally:
+            current_query_stats.reset(query_token)
+            current_route_stats.reset(route_token)
+            if self.metrics:
+                self.observe(scope, stats)
+            if self.profiling:
+                log_repeated(stats.queries)
+
+    @staticmethod
+    def observe(scope, stats: RouteStats):
+        """Exports the statistics of a request, if it matched a route."""
+        route = scope.get("route")
+        if route is None:
+            return
+
+        labels = (scope["method"], route.path)
+        REQUEST_DB_QUERIES.labels(*labels).observe(stats.queries.queries)
+        REQUEST_DB_SECONDS.labels(*labels).observe(stats.queries.seconds)
+        REQUEST_DB_ROWS.labels(*labels).observe(stats.queries.rows)
+        REQUEST_SERIALIZATION_SECONDS.labels(*labels).observe(stats.serialization)
+        if stats.background is not None:
+            REQUEST_BACKGROUND_SECONDS.labels(*labels).observe(stats.background)
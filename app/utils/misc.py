@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import TypeVar
+from typing import Tuple, TypeVar
 
 from toml import loads
 
@@ -12,8 +12,24 @@ def get_version():
     return data["tool"]["poetry"]["version"]
 
 
-def get_current_week():
-    return datetime.now().isocalendar()[1]
+def get_iso_week(delta_weeks: int = 0) -> Tuple[int, int]:
+    """Returns the ISO (year, week) of the current week plus delta_weeks."""
+    iso = (datetime.now() + timedelta(weeks=delta_weeks)).isocalendar()
+    return iso[0], iso[1]
+
+
+def get_week_range(year: int, week: int) -> Tuple[date, date]:
+    """Returns the half-open [monday, next monday) range of an ISO week.
+
+    Raises ValueError if the week doesn't exist in that year, or if it ends
+    after date.max (the last week of year 9999), as its end can't be
+    represented.
+    """
+    start = date.fromisocalendar(year, week, 1)
+    try:
+        return start, start + timedelta(days=7)
+    except OverflowError as exc:
+        raise ValueError(f"Week {week} of {year} ends after {date.max}") from exc
 
 
 def lowercase(obj: T) -> T:
@@ -4,7 +4,9 @@ from logging import getLogger
 from uuid import uuid4
 
 from fastapi import Request
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+
+from ..deps.conditional import NotModified
 
 logger = getLogger(__name__)
 
@@ -34,3 +36,8 @@ def catch_errors(request: Request, exc: Exception):
         },
         headers={"X-Error-ID": str(error_id)},
     )
+
+
+def not_modified(_: Request, exc: NotModified):
+    """Returns 304 with the validators of the resource."""
+    return Response(status_code=304, headers=exc.headers)
@@ -0,0 +1,619 @@
+"""Benchmark of the API endpoints, with regression thresholds.
+
+The application is booted in process against a throwaway database seeded
+with years of meals, with local stand-ins for Notion (an HTTP server), S3
+and Todoist. Every route of the meals, analytics and cron routers is requested
+sequentially, and the latency percentiles and throughput of each one are
+saved as a JSON baseline. Later runs are compared against the baseline and
+fail if the median latency of a hot path regressed beyond the threshold.
+"""
+
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import click
+from botocore.exceptions import ClientError
+
+DISHES = [
+    "lentejas",
+    "lentejas con chorizo",
+    "garbanzos",
+    "paella",
+    "arroz a la cubana",
+    "macarrones",
+    "espaguetis carbonara",
+    "tortilla de patatas",
+    "pollo asado",
+    "pescado al horno",
+    "merluza rebozada",
+    "crema de calabacín",
+    "sopa de fideos",
+    "ensalada",
+    "croquetas",
+    "hamburguesa",
+    "pizza",
+    "judías verdes",
+    "Variable",
+]
+YEAR = datetime.date.today().year
+# Far from the seeded meals, so writes don't collide with them
+WRITE_START = datetime.date(2100, 1, 1)
+
+
+class Case(NamedTuple):
+    """A request to benchmark.
+
+    `request(i)` returns the method, path and keyword arguments of the i-th
+    request, and `setup(i)` (not measured) prepares the database for it.
+    """
+
+    name: str
+    request: Callable[[int], tuple]
+    hot: bool = False
+    slow: bool = False
+    setup: Optional[Callable[[int], None]] = None
+
+
+class NotionStandIn(BaseHTTPRequestHandler):
+    """Answers every request to the Notion API successfully."""
+
+    requests = 0
+
+    def do_PATCH(self):  # pylint: disable=invalid-name
+        """Updates a block."""
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        NotionStandIn.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(b'{"object": "block"}')
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        pass
+
+
+class S3StandIn:
+    """In-memory S3 client with the operations used by the backups."""
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+
+    @staticmethod
+    def _not_found(operation: str):
+        return ClientError({"Error": {"Code": "NoSuchKey"}}, operation)
+
+    def head_bucket(self, **_):
+        return {}
+
+    def create_bucket(self, **_):
+        return {}
+
+    def get_object(self, *, Key, **_):  # pylint: disable=invalid-name
+        if Key not in self.objects:
+            raise self._not_found("GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, *, Key, Body, **_):  # pylint: disable=invalid-name
+        self.objects[Key] = Body
+
+    def upload_fileobj(self, fp, _bucket, key, **_):
+        self.objects[key] = fp.read()
+
+    def delete_object(self, *, Key, **_):  # pylint: disable=invalid-name
+        self.objects.pop(Key, None)
+
+
+class TodoistStandIn:
+    """Todoist API which keeps the tasks added in memory."""
+
+    tasks: List[str] = []
+
+    def __init__(self, _token):
+        self.items = self
+
+    def add(self, content, **_):
+        TodoistStandIn.tasks.append(content)
+
+    def commit(self):
+        pass
+
+
+def make_meal(day: datetime.date, rng: random.Random) -> Dict:
+    """Returns a random meal."""
+    return {
+        "id": day,
+        "lunch1": rng.choice(DISHES),
+        "lunch1_frozen": rng.random() < 0.1,
+        "lunch2": rng.choice([None, None, *DISHES]),
+        "lunch2_frozen": False,
+        "dinner": rng.choice(DISHES),
+        "dinner_frozen": rng.random() < 0.1,
+    }
+
+
+def to_json(meal: Dict) -> Dict:
+    """Returns the body to send a meal to the API."""
+    body = {k: v for k, v in meal.items() if k != "id"}
+    body["date"] = meal["id"].isoformat()
+    return body
+
+
+def get_cases(meals: Dict[datetime.date, Dict], upsert, rng) -> List[Case]:
+    """Returns the cases of every route of the meals, analytics and cron
+    routers.
+
+    `upsert(rows)` saves meals directly, to restore the ones a case deletes.
+    """
+    # pylint: disable=too-many-locals
+    today = datetime.date.today()
+    history = sorted(x for x in meals if x < today)
+    week = 10
+    week_start = datetime.date.fromisocalendar(YEAR, week, 1)
+    past_week_start = datetime.date.fromisocalendar(YEAR - 1, week, 1)
+    current_week_start = today - datetime.timedelta(days=today.weekday())
+    # Placeholders aren't dishes
+    eaten = sorted({x["dinner"] for x in meals.values()} - {"N/A", "Variable"})
+
+    def restore(start: datetime.date, days: int = 7):
+        def setup(_):
+            upsert([meals[start + datetime.timedelta(days=x)] for x in range(days)])
+
+        return setup
+
+    def create_at(start: datetime.date):
+        def setup(i):
+            upsert([make_meal(start + datetime.timedelta(days=i), rng)])
+
+        return setup
+
+    # A chain of 14 planned days ending in an empty one, restored every time
+    shift_start = WRITE_START + datetime.timedelta(days=3000)
+    chain = [
+        make_meal(shift_start + datetime.timedelta(days=x), rng) for x in range(15)
+    ]
+    chain[-1].update(lunch1="N/A", lunch2=None, dinner="N/A")
+
+    def day(start: datetime.date, i: int) -> str:
+        return (start + datetime.timedelta(days=i)).isoformat()
+
+    def random_day() -> str:
+        return rng.choice(history).isoformat()
+
+    def random_month() -> Dict[str, str]:
+        start = rng.choice(history[:-31])
+        return {"from": start.isoformat(), "to": day(start, 30)}
+
+    return [
+        Case(
+            "GET /meals",
+            lambda i: ("GET", "/meals", {"params": {"limit": 100}}),
+            hot=True,
+        ),
+        Case(
+            "GET /meals?from&to",
+            lambda i: (
+                "GET",
+                "/meals",
+                {"params": random_month()},
+            ),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/week/current",
+            lambda i: ("GET", "/meals/week/current", {}),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/week/next", lambda i: ("GET", "/meals/week/next", {}), hot=True
+        ),
+        Case(
+            "GET /meals/week/{week}",
+            lambda i: ("GET", f"/meals/week/{week}", {}),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/week/{year}/{week}",
+            lambda i: ("GET", f"/meals/week/{YEAR - 1}/{i % 52 + 1}", {}),
+            hot=True,
+        ),
+        Case("GET /meals/today", lambda i: ("GET", "/meals/today", {}), hot=True),
+        Case("GET /meals/tomorrow", lambda i: ("GET", "/meals/tomorrow", {}), hot=True),
+        Case(
+            "GET /meals/{date}",
+            lambda i: ("GET", f"/meals/{random_day()}", {}),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/search",
+            lambda i: ("GET", "/meals/search", {"params": {"q": "lent"}}),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/suggestions",
+            lambda i: (
+                "GET",
+                "/meals/suggestions",
+                {"params": {"date": day(today, 7), "slot": "lunch1"}},
+            ),
+            hot=True,
+        ),
+        Case(
+            "GET /meals/export",
+            lambda i: ("GET", "/meals/export", {"params": {"format": "csv"}}),
+            slow=True,
+        ),
+        Case(
+            "POST /meals",
+            lambda i: (
+                "POST",
+                "/meals",
+                {
+                    "json": to_json(
+                        make_meal(WRITE_START + datetime.timedelta(days=i), rng)
+                    )
+                },
+            ),
+        ),
+        Case(
+            "POST /meals/bulk",
+            lambda i: (
+                "POST",
+                "/meals/bulk",
+                {
+                    "json": [
+                        to_json(
+                            make_meal(
+                                WRITE_START + datetime.timedelta(days=1000 + 7 * i + x),
+                                rng,
+                            )
+                        )
+                        for x in range(7)
+                    ]
+                },
+            ),
+        ),
+        Case(
+            "PUT /meals/bulk",
+            lambda i: (
+                "PUT",
+                "/meals/bulk",
+                {
+                    "json": [
+                        to_json(
+                            make_meal(datetime.date.fromisoformat(random_day()), rng)
+                        )
+                        for _ in range(7)
+                    ]
+                },
+            ),
+        ),
+        Case(
+            "PUT /meals/swap",
+            lambda i: (
+                "PUT",
+                "/meals/swap",
+                {
+                    "params": {
+                        "meal_1": random_day(),
+                        "meal_2": random_day(),
+                        "mode": "all",
+                    }
+                },
+            ),
+        ),
+        Case(
+            "PUT /meals/shift/{date}",
+            lambda i: (
+                "PUT",
+                f"/meals/shift/{shift_start}",
+                {"params": {"mode": "all"}},
+            ),
+            setup=lambda i: upsert(chain),
+        ),
+        Case(
+            "PUT /meals/{date}",
+            lambda i: (
+                "PUT",
+                f"/meals/{random_day()}",
+                {"json": {"lunch1": rng.choice(DISHES)}},
+            ),
+        ),
+        Case(
+            "DELETE /meals",
+            lambda i: (
+                "DELETE",
+                "/meals",
+                {"params": {"from": week_start.isoformat(), "to": day(week_start, 6)}},
+            ),
+            setup=restore(week_start),
+        ),
+        Case(
+            "DELETE /meals/week/current",
+            lambda i: ("DELETE", "/meals/week/current", {}),
+            setup=restore(current_week_start),
+        ),
+        Case(
+            "DELETE /meals/week/{week}",
+            lambda i: ("DELETE", f"/meals/week/{week}", {}),
+            setup=restore(week_start),
+        ),
+        Case(
+            "DELETE /meals/week/{year}/{week}",
+            lambda i: ("DELETE", f"/meals/week/{YEAR - 1}/{week}", {}),
+            setup=restore(past_week_start),
+        ),
+        Case(
+            "DELETE /meals/{date}",
+            lambda i: ("DELETE", f"/meals/{day(WRITE_START, 2000 + i)}", {}),
+            setup=create_at(WRITE_START + datetime.timedelta(days=2000)),
+        ),
+        Case(
+            "GET /analytics/dishes",
+            lambda i: ("GET", "/analytics/dishes", {"params": {"order": "stale"}}),
+            hot=True,
+        ),
+        Case(
+            "GET /analytics/dishes/{dish}",
+            lambda i: ("GET", f"/analytics/dishes/{rng.choice(eaten)}", {}),
+            hot=True,
+        ),
+        Case(
+            "POST /analytics/rebuild",
+            lambda i: ("POST", "/analytics/rebuild", {}),
+            slow=True,
+        ),
+        Case(
+            "POST /cron/backup-database",
+            lambda i: ("POST", "/cron/backup-database", {}),
+            slow=True,
+        ),
+        Case(
+            "POST /cron/check-frozen-meals",
+            lambda i: ("POST", "/cron/check-frozen-meals", {}),
+            slow=True,
+        ),
+        Case(
+            "POST /cron/update-notion-meals",
+            lambda i: ("POST", "/cron/update-notion-meals", {}),
+            slow=True,
+        ),
+        Case(
+            "GET /cron/{cron}/runs",
+            lambda i: ("GET", "/cron/check-frozen-meals/runs", {}),
+            hot=True,
+        ),
+    ]
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Returns the percentiles (in ms) and the throughput of a case."""
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "p50": cuts[49] * 1000,
+        "p90": cuts[89] * 1000,
+        "p99": cuts[98] * 1000,
+        "max": max(latencies) * 1000,
+        "throughput": len(latencies) / elapsed,
+    }
+
+
+def run_case(client, case: Case, requests: int, warmup: int) -> Dict[str, float]:
+    """Sends the requests of a case one after the other."""
+    headers = {"x-token": os.environ["API_TOKEN"]}
+    latencies = []
+    elapsed = 0.0
+    for i in range(warmup + requests):
+        if case.setup:
+            case.setup(i)
+        method, path, kwargs = case.request(i)
+
+        start = perf_counter()
+        response = client.request(method, path, headers=headers, **kwargs)
+        latency = perf_counter() - start
+
+        if response.status_code >= 400:
+            raise click.ClickException(
+                f"{case.name}: {response.status_code} {response.text[:200]}"
+            )
+        if i >= warmup:
+            latencies.append(latency)
+            elapsed += latency
+    return summarize(latencies, elapsed)
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Returns the hot paths whose median latency regressed beyond the
+    threshold (a ratio) since the baseline."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline["results"].get(name)
+        if not base or not result["hot"]:
+            continue
+        change = result["p50"] / base["p50"] - 1
+        if change > threshold:
+            regressions.append(
+                f"{name}: p50 {base['p50']:.2f} ms -> {result['p50']:.2f} ms "
+                f"(+{change:.0%})"
+            )
+    return regressions
+
+
+def start_notion_stand_in() -> str:
+    """Starts the Notion stand-in in a thread, returning its URL."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NotionStandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/v1"
+
+
+def configure(database_uri: str, notion_url: str):
+    """Points the settings to the throwaway database and the stand-ins.
+
+    Settings are read when the app is imported, so this must run first.
+    Required settings without a value get dummy ones.
+    """
+    os.environ.update(
+        DATABASE_URI=database_uri,
+        NOTION_API_URL=notion_url,
+        NOTION_MAX_RETRIES="0",
+        PRODUCTION="true",
+        DISABLE_CRON_INTEGRATION="true",
+        ENABLE_PROMETHEUS="false",
+    )
+    for name, value in {
+        "API_TOKEN": "benchmark",
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        "S3_BUCKET_NAME": "benchmark",
+        "NOTION_BLOCK_ID": "00000000-0000-4000-8000-000000000000",
+        "NOTION_KEY": "benchmark",
+        "TODOIST_PROJECT_ID": "1",
+        "TODOIST_TOKEN": "benchmark",
+        "MYSQL_DATABASE": "benchmark",
+        "MYSQL_HOST": "localhost",
+        "MYSQL_PASSWORD": "benchmark",
+        "MYSQL_PORT": "3306",
+        "MYSQL_USER": "benchmark",
+    }.items():
+        os.environ.setdefault(name, value)
+
+
+@click.command()
+@click.option("--years", default=5, show_default=True, help="Years of meals.")
+@click.option("--requests", default=200, show_default=True, help="Requests per route.")
+@click.option("--warmup", default=10, show_default=True, help="Unmeasured requests.")
+@click.option(
+    "--database-uri",
+    help="Throwaway database. Its tables are dropped. Defaults to a SQLite file.",
+)
+@click.option(
+    "--baseline",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=".benchmark-endpoints.json",
+    show_default=True,
+    help="Results to compare with. Created if it doesn't exist.",
+)
+@click.option(
+    "--threshold",
+    default=0.25,
+    show_default=True,
+    help="Max increase of the median latency of a hot path (0.25 is +25%).",
+)
+@click.option("--save", is_flag=True, help="Replace the baseline with the results.")
+def benchmark_endpoints(
+    years, requests, warmup, database_uri, baseline, threshold, save
+):
+    """Measures the latency and throughput of every meal, analytics and cron
+    route."""
+    # pylint: disable=too-many-arguments,too-many-locals,import-outside-toplevel
+    if database_uri is None:
+        database_uri = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+    elif not database_uri.startswith("sqlite"):
+        click.confirm(f"The tables of {database_uri!r} will be lost", abort=True)
+
+    configure(database_uri, start_notion_stand_in())
+
+    from fastapi.testclient import TestClient
+
+    from app import crud
+    from app.core import aws, todoist
+    from app.db.base_class import Base
+    from app.db.session import SessionLocal, engine
+    from app.main import get_application
+    from app.schemas.meal import MealCreate
+
+    s3 = S3StandIn()
+    aws.get_s3_client = lambda: s3
+    todoist.TodoistAPI = TodoistStandIn
+
+    rng = random.Random(0)
+    today = datetime.date.today()
+    first = today - datetime.timedelta(days=365 * years)
+    meals = {}
+    for offset in range((today - first).days + 60):
+        day = first + datetime.timedelta(days=offset)
+        meals[day] = make_meal(day, rng)
+    # Something to defrost, so check-frozen-meals adds a task
+    meals[today + datetime.timedelta(days=1)]["dinner_frozen"] = True
+    for start in (
+        datetime.date.fromisocalendar(YEAR, 10, 1),
+        datetime.date.fromisocalendar(YEAR - 1, 10, 1),
+    ):
+        for offset in range(7):
+            day = start + datetime.timedelta(days=offset)
+            meals.setdefault(day, make_meal(day, rng))
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        rows = sorted(meals.values(), key=lambda x: x["id"])
+        db.bulk_insert_mappings(crud.meal.model, rows, render_nulls=True)
+        db.commit()
+
+    def upsert(rows):
+        with SessionLocal() as db:
+            obj_in = [MealCreate(**to_json(x)) for x in rows]
+            crud.meal.upsert_multiple(db, obj_in=obj_in)
+
+    click.echo(f"Seeded {len(meals)} meals in {engine.url.render_as_string()}")
+
+    results = {}
+    with TestClient(get_application()) as client:
+        for case in get_cases(meals, upsert, rng):
+            count = max(requests // 10, 5) if case.slow else requests
+            results[case.name] = {
+                "hot": case.hot,
+                **run_case(client, case, count, min(warmup, count)),
+            }
+            result = results[case.name]
+            click.echo(
+                f"{case.name:<34} p50 {result['p50']:8.2f} ms  p90 {result['p90']:8.2f} ms"
+                f"  p99 {result['p99']:8.2f} ms  {result['throughput']:8.1f} req/s"
+            )
+
+    click.echo(
+        f"Stand-ins: {NotionStandIn.requests} Notion updates, "
+        f"{len(TodoistStandIn.tasks)} Todoist tasks"
+    )
+
+    report = {
+        "meta": {
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "years": years,
+            "requests": requests,
+        },
+        "results": results,
+    }
+
+    if save or not baseline.exists():
+        baseline.write_text(json.dumps(report, indent=2, sort_keys=True))
+        click.echo(f"Baseline saved in {baseline}")
+        return
+
+    previous = json.loads(baseline.read_text())
+    regressions = compare(results, previous, threshold)
+    if regressions:
+        raise click.ClickException(
+            f"Hot paths slower than the baseline ({baseline}) by more than "
+            f"{threshold:.0%}:\n" + "\n".join(regressions)
+        )
+    click.echo(f"No hot path is {threshold:.0%} slower than the baseline ({baseline})")
+
+
+if __name__ == "__main__":
+    benchmark_endpoints()
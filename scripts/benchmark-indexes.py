@@ -0,0 +1,153 @@
+"""Benchmark of the writes of meals with and without the legacy indexes."""
+
+import datetime
+import importlib.util
+import random
+from pathlib import Path
+from time import perf_counter
+from typing import Dict
+
+import click
+from sqlalchemy import Index, MetaData, create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud
+from app.core.meals import SwapMode
+from app.db.base_class import Base
+from app.models import Meal
+from app.schemas.meal import MealCreate
+
+START = datetime.date(2000, 1, 1)
+DISHES = ["lentejas", "paella", "macarrones", "tortilla", "pollo asado", "N/A"]
+CHUNK_SIZE = 500
+
+LEGACY_INDEXES_MIGRATION = (
+    Path(__file__).parent.parent
+    / "alembic/versions/8d3f6a2c1e57_drop_unused_meal_indexes.py"
+)
+
+
+def get_legacy_indexes() -> Dict[str, str]:
+    """Returns the indexes dropped by the migration 8d3f6a2c1e57 (name to
+    column), read from the migration itself."""
+    spec = importlib.util.spec_from_file_location(
+        "drop_unused_meal_indexes", LEGACY_INDEXES_MIGRATION
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.INDEXES
+
+
+def make_meals(days: int):
+    """Returns the meals of `days` consecutive days."""
+    rng = random.Random(days)
+    return [
+        MealCreate(
+            date=START + datetime.timedelta(days=i),
+            lunch1=rng.choice(DISHES),
+            lunch1_frozen=rng.random() < 0.1,
+            lunch2=rng.choice([None, *DISHES]),
+            lunch2_frozen=False,
+            dinner=rng.choice(DISHES),
+            dinner_frozen=rng.random() < 0.1,
+        )
+        for i in range(days)
+    ]
+
+
+def get_sizes(engine) -> Dict[str, int]:
+    """Returns the bytes used by the meal table and its indexes."""
+    if engine.dialect.name == "sqlite":
+        query = "SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"
+    elif engine.dialect.name == "mysql":
+        query = (
+            "SELECT index_name, stat_value * @@innodb_page_size "
+            "FROM mysql.innodb_index_stats "
+            "WHERE table_name = 'meal' AND stat_name = 'size'"
+        )
+    else:
+        return {}
+
+    with engine.connect() as conn:
+        if engine.dialect.name == "mysql":
+            conn.execute(text("ANALYZE TABLE meal"))
+        sizes = dict(conn.execute(text(query)).fetchall())
+    return {k: int(v) for k, v in sizes.items() if "meal" in k or k == "PRIMARY"}
+
+
+def run(engine, days: int, swaps: int) -> Dict[str, float]:
+    """Inserts, swaps and shifts meals, returning the seconds of each step."""
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    meals = make_meals(days)
+    rng = random.Random(swaps)
+    timings = {}
+
+    with session() as db:
+        start = perf_counter()
+        for idx in range(0, days, CHUNK_SIZE):
+            crud.meal.create_multiple(db, obj_in=meals[idx : idx + CHUNK_SIZE])
+        timings["insert"] = perf_counter() - start
+
+        start = perf_counter()
+        for _ in range(swaps):
+            date_1, date_2 = rng.sample(meals, 2)
+            crud.meal.swap(db, date_1=date_1.id, date_2=date_2.id, mode=SwapMode.ALL)
+        timings["swap"] = perf_counter() - start
+
+        start = perf_counter()
+        crud.meal.shift(db, date=START, mode=SwapMode.ALL)
+        timings["shift"] = perf_counter() - start
+
+    return timings
+
+
+@click.command()
+@click.option("--years", default=10, show_default=True, help="Years of meals.")
+@click.option("--swaps", default=1000, show_default=True, help="Swaps to run.")
+@click.option(
+    "--database-uri",
+    default="sqlite://",
+    show_default=True,
+    help="Throwaway database. Its meal table is dropped.",
+)
+def benchmark_indexes(years: int, swaps: int, database_uri: str):
+    """Measures the write throughput and index size of the meal table, with
+    the legacy indexes and with the current ones."""
+    if not database_uri.startswith("sqlite"):
+        click.confirm(f"The meal table of {database_uri!r} will be lost", abort=True)
+
+    engine = create_engine(
+        database_uri,
+        connect_args={"check_same_thread": False} if "sqlite" in database_uri else {},
+        poolclass=StaticPool,
+    )
+    days = years * 365
+
+    # Only the writes are measured, not the caches and in-memory views
+    crud.meal.cache.max_size = 0
+    crud.meal.listeners = []
+
+    for variant in ("legacy", "current"):
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        if variant == "legacy":
+            # Built on a copy, not to add them to the model
+            table = Meal.__table__.to_metadata(MetaData())
+            for name, column in get_legacy_indexes().items():
+                Index(name, table.c[column]).create(engine)
+
+        timings = run(engine, days, swaps)
+        sizes = get_sizes(engine)
+        indexes = sum(v for k, v in sizes.items() if k.startswith("ix_meal"))
+
+        click.echo(
+            f"{variant:>7}: insert {days / timings['insert']:8.0f} meals/s, "
+            f"swap {swaps / timings['swap']:6.0f} swaps/s, "
+            f"shift {days / timings['shift']:8.0f} meals/s, "
+            f"indexes {indexes / 1024:7.1f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_indexes()
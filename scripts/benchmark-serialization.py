@@ -0,0 +1,98 @@
+"""Benchmark of the serialization of meal responses."""
+
+import datetime
+from functools import partial
+from timeit import Timer
+from typing import List, Union
+
+import click
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from starlette.responses import JSONResponse, Response
+
+from app.core.meals import MealsResponse, simplify
+from app.models import Meal
+from app.schemas.meal import Meal as MealSchema
+from app.schemas.meal import SimpleMeal
+
+START = datetime.date(2000, 1, 1)
+SIZES = (1, 7, 1000)
+
+# Built once per route by FastAPI
+_CustomMeal = Union[MealSchema, SimpleMeal]
+RESPONSE_FIELD = create_response_field(name="response", type_=_CustomMeal)
+LIST_RESPONSE_FIELD = create_response_field(name="response", type_=List[_CustomMeal])
+
+
+def make_meals(rows: int) -> List[Meal]:
+    """Returns detached meals, like the ones read from the database."""
+    return [
+        Meal(
+            id=START + datetime.timedelta(days=i),
+            lunch1=f"lunch-{i}",
+            lunch1_frozen=False,
+            lunch2=None if i % 2 else f"lunch2-{i}",
+            lunch2_frozen=False,
+            dinner=f"dinner-{i}",
+            dinner_frozen=i % 7 == 0,
+        )
+        for i in range(rows)
+    ]
+
+
+def run_sync(coroutine):
+    """Runs a coroutine which never awaits, without the cost of an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as exc:
+        return exc.value
+    raise RuntimeError("The coroutine awaited")
+
+
+def validated(meals, simple: bool) -> bytes:
+    """Serializes like the routes did: simplify and validate the response model."""
+    many = len(meals) > 1
+    field = LIST_RESPONSE_FIELD if many else RESPONSE_FIELD
+    content = meals if many else meals[0]
+    if many:
+        content = simplify(content, List[SimpleMeal], simple)
+    else:
+        content = simplify(content, SimpleMeal, simple)
+
+    serialized = run_sync(
+        serialize_response(field=field, response_content=content, exclude_unset=True)
+    )
+    return JSONResponse(serialized).body
+
+
+def fast(meals, simple: bool) -> bytes:
+    """Serializes with the precomputed serializers."""
+    content = meals if len(meals) > 1 else meals[0]
+    return MealsResponse(content, simple=simple, response=Response()).body
+
+
+@click.command()
+@click.option("--repeat", default=5, show_default=True, help="Number of runs.")
+def benchmark_serialization(repeat: int):
+    """Measures the cost per meal of serializing meal responses."""
+    for rows in SIZES:
+        meals = make_meals(rows)
+        for simple in (False, True):
+            assert validated(meals, simple) == fast(meals, simple)
+
+            output = "simple" if simple else "normal"
+            results = []
+            for func in (validated, fast):
+                timer = Timer(partial(func, meals, simple))
+                number, _ = timer.autorange()
+                best = min(timer.repeat(repeat, number)) / number
+                results.append(best / rows * 1e6)
+
+            click.echo(
+                f"{rows:>5} rows, {output:>6}: validated {results[0]:8.2f} us/row, "
+                f"fast {results[1]:8.2f} us/row ({results[0] / results[1]:.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    benchmark_serialization()
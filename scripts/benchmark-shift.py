@@ -0,0 +1,89 @@
+"""Benchmark of the shift of long chains of consecutive meals."""
+
+import datetime
+from time import perf_counter
+
+import click
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import crud
+from app.core.meals import SwapMode
+from app.db.base_class import Base
+from app.models import Meal
+
+START = datetime.date(2000, 1, 1)
+
+
+def seed(db, days: int):
+    """Fills `days` consecutive days, so the whole range must be shifted."""
+    db.query(Meal).delete()
+    db.bulk_insert_mappings(
+        Meal,
+        [
+            {
+                "id": START + datetime.timedelta(days=i),
+                "lunch1": f"lunch-{i}",
+                "lunch1_frozen": False,
+                "lunch2": None,
+                "lunch2_frozen": False,
+                "dinner": f"dinner-{i}",
+                "dinner_frozen": i % 7 == 0,
+            }
+            for i in range(days)
+        ],
+    )
+    db.commit()
+
+
+@click.command()
+@click.option("--days", default=10_000, show_default=True, help="Chain length.")
+@click.option("--repeat", default=3, show_default=True, help="Number of runs.")
+@click.option(
+    "--database-uri",
+    default="sqlite://",
+    show_default=True,
+    help="Throwaway database. Its meal table is dropped.",
+)
+def benchmark_shift(days: int, repeat: int, database_uri: str):
+    """Measures the time and SQL statements needed to shift a chain of meals."""
+    if not database_uri.startswith("sqlite"):
+        click.confirm(f"The meal table of {database_uri!r} will be lost", abort=True)
+
+    engine = create_engine(
+        database_uri,
+        connect_args={"check_same_thread": False} if "sqlite" in database_uri else {},
+        poolclass=StaticPool,
+    )
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    statements = 0
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_statement(*_):
+        nonlocal statements
+        statements += 1
+
+    # Only the shift is measured, not the caches and in-memory views
+    crud.meal.cache.max_size = 0
+    crud.meal.listeners = []
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    for run in range(1, repeat + 1):
+        with session() as db:
+            seed(db, days)
+
+            statements = 0
+            start = perf_counter()
+            shifted = crud.meal.shift(db, date=START, mode=SwapMode.ALL)
+            elapsed = perf_counter() - start
+
+        click.echo(
+            f"run {run}: shifted {len(shifted)} days in {elapsed * 1000:.1f} ms "
+            f"({statements} statements, {elapsed / len(shifted) * 1e6:.1f} us/day)"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_shift()
@@ -1,28 +1,201 @@
-"""Script to import data from AWS into the database using the API."""
+"""Script to import data from AWS into the database using the API.
 
+The backup is read as a stream and sent in chunks of consecutive meals to
+`PUT /meals/bulk`, optionally several at a time. Upserts are idempotent, so a failed
+import can simply be rerun: with a checkpoint, the chunks already imported
+are skipped.
+"""
+
+import datetime
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urljoin
 
 import click
 import requests
 from fastapi.encoders import jsonable_encoder
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from app.core.aws import get_meals
+from app.core.aws import iter_meals
 from app.core.config import settings
+from app.schemas.meal import Meal
+
+
+def get_session(concurrency: int) -> requests.Session:
+    """Returns a session with a connection per worker, retrying server errors."""
+    retry = Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["PUT"],
+    )
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=concurrency, max_retries=retry))
+    session.mount("https://", HTTPAdapter(pool_maxsize=concurrency, max_retries=retry))
+    session.headers.update({"x-token": settings.API_TOKEN, "user-agent": "mealer"})
+    return session
+
+
+def iter_chunks(meals: Iterable[Meal], size: int) -> Iterator[List[Meal]]:
+    """Groups meals in chunks of `size` meals."""
+    meals = iter(meals)
+    while True:
+        chunk = list(islice(meals, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_checkpoint(path: Optional[Path]) -> Optional[datetime.date]:
+    """Returns the last date imported according to the checkpoint."""
+    if path is None or not path.exists():
+        return None
+    return datetime.date.fromisoformat(json.loads(path.read_text())["last_date"])
+
+
+def write_checkpoint(path: Optional[Path], last_date: datetime.date):
+    """Saves the last date imported, replacing the file atomically."""
+    if path is None:
+        return
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"last_date": last_date.isoformat()}))
+    tmp.replace(path)
+
+
+class Importer:
+    """Sends chunks of meals concurrently, tracking the imported ones."""
+
+    def __init__(self, *, url: str, session, dry_run: bool, checkpoint: Optional[Path]):
+        self.url = url
+        self.session = session
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+
+        # Chunks can finish in any order: the checkpoint only advances up to
+        # the last chunk whose predecessors have all finished
+        self._done: Dict[int, datetime.date] = {}
+        self._next = 0
+
+    def send(self, chunk: List[Meal]) -> Dict:
+        """Upserts a chunk of meals."""
+        response = self.session.put(
+            self.url,
+            params={"dry_run": "true"} if self.dry_run else None,
+            json=jsonable_encoder(chunk),
+            timeout=(5, 120),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def finish(self, index: int, chunk: List[Meal], result: Dict):
+        """Accounts for a finished chunk."""
+        for key in self.totals:
+            self.totals[key] += result[key]
+
+        if self.dry_run:
+            for date in result.get("inserted_dates", []):
+                click.echo(f"+ {date}")
+            for date in result.get("updated_dates", []):
+                click.echo(f"~ {date}")
+            return
+
+        click.echo(
+            f"{chunk[0].id} - {chunk[-1].id}: {result['inserted']} inserted, "
+            f"{result['updated']} updated, {result['unchanged']} unchanged"
+        )
+        self._done[index] = chunk[-1].id
+        last_date = None
+        while self._next in self._done:
+            last_date = self._done.pop(self._next)
+            self._next += 1
+        if last_date is not None:
+            write_checkpoint(self.checkpoint, last_date)
+
+    def run(self, chunks: Iterable[List[Meal]], concurrency: int):
+        """Imports the chunks, with at most `concurrency` in flight."""
+        with ThreadPoolExecutor(concurrency) as executor:
+            pending = {}
+            for index, chunk in enumerate(chunks):
+                if len(pending) >= concurrency:
+                    self._collect(pending, FIRST_COMPLETED)
+                pending[executor.submit(self.send, chunk)] = index, chunk
+            self._collect(pending, None)
+
+    def _collect(self, pending: Dict, return_when):
+        kwargs = {"return_when": return_when} if return_when else {}
+        done, _ = wait(pending, **kwargs)
+        for future in done:
+            index, chunk = pending.pop(future)
+            try:
+                result = future.result()
+            except requests.RequestException as exc:
+                raise click.ClickException(
+                    f"Error importing {chunk[0].id} - {chunk[-1].id}: {exc}. "
+                    "Rerun the import to continue from the last checkpoint."
+                ) from exc
+            self.finish(index, chunk, result)
 
 
 @click.command("import")
 @click.argument("API_URL", envvar="MEAL_PLANNER_API_URL")
-def import_aws_db(api_url):
+@click.option(
+    "--chunk-size", default=500, show_default=True, help="Meals sent per request."
+)
+@click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    help="Requests sent in parallel (chunks of consecutive dates may lock each "
+    "other on MySQL).",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=".import-checkpoint.json",
+    show_default=True,
+    help="File to save the progress, to resume a failed import.",
+)
+@click.option(
+    "--no-checkpoint", is_flag=True, help="Import everything, saving nothing."
+)
+@click.option("--dry-run", is_flag=True, help="Show the changes without saving them.")
+def import_aws_db(api_url, chunk_size, concurrency, checkpoint, no_checkpoint, dry_run):
     """Imports the data from AWS into the database using the API."""
-    click.confirm(f"Import AWS DB to {api_url!r}?", abort=True, default=True)
-    headers = {"x-token": settings.API_TOKEN, "user-agent": "mealer"}
+    if no_checkpoint or dry_run:
+        checkpoint = None
+
+    last_date = read_checkpoint(checkpoint)
+    if last_date:
+        click.echo(f"Resuming import after {last_date} ({checkpoint})")
+
+    if not dry_run:
+        click.confirm(f"Import AWS DB to {api_url!r}?", abort=True, default=True)
+
+    meals = iter_meals()
+    if last_date:
+        meals = (x for x in meals if x.id > last_date)
 
-    url = urljoin(api_url, "/meals/bulk")
-    data = jsonable_encoder(get_meals())
-    r = requests.post(url, json=data, headers=headers)
+    importer = Importer(
+        url=urljoin(api_url, "/meals/bulk"),
+        session=get_session(concurrency),
+        dry_run=dry_run,
+        checkpoint=checkpoint,
+    )
+    importer.run(iter_chunks(meals, chunk_size), concurrency)
 
-    print(r.json())
-    r.raise_for_status()
+    totals = importer.totals
+    verb = "would be" if dry_run else "were"
+    click.echo(
+        f"{totals['inserted']} meals {verb} inserted, {totals['updated']} {verb} "
+        f"updated and {totals['unchanged']} were unchanged"
+    )
+    if checkpoint is not None and checkpoint.exists():
+        checkpoint.unlink()
 
 
 if __name__ == "__main__":
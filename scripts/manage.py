@@ -144,7 +144,7 @@ def upload_json(date: str, api_url: str):
 
     url = urljoin(api_url, "/meals/bulk")
     data = json.loads(filepath.read_text("utf8"))
-    r = requests.post(url, json=data, headers=headers)
+    r = requests.put(url, json=data, headers=headers)
     print(r.json())
     r.raise_for_status()
 